@@ -0,0 +1,32 @@
+-- Tables of the original schema, only created when missing so that existing databases are kept
+
+CREATE TABLE IF NOT EXISTS images (
+    image_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fn TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tagged_images (
+    image_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (image_id, tag_id)
+);
+
+CREATE TABLE IF NOT EXISTS tags (
+    tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT,
+    used INTEGER,
+    lang TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tags_en (
+    tag_id INTEGER PRIMARY KEY NOT NULL,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS tags_fr (
+    tag_id INTEGER PRIMARY KEY NOT NULL,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT
+);
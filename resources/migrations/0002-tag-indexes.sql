@@ -0,0 +1,6 @@
+-- The primary key of tagged_images only helps looking up the tags of an image, this index
+-- serves the lookups of the images of a tag (search, tag info, merging and deleting tags).
+-- images(fn) and image_files(fn) need no extra index: the index backing their UNIQUE
+-- constraint already covers the rowid (image_id / file_id).
+
+CREATE INDEX IF NOT EXISTS tagged_images_by_tag ON tagged_images (tag_id, image_id);
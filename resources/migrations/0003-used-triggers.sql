@@ -0,0 +1,24 @@
+-- Keep tags.used in sync with tagged_images in the database instead of in every endpoint
+
+UPDATE tags SET used = (
+    SELECT COUNT(*) FROM tagged_images WHERE tagged_images.tag_id = tags.tag_id
+);
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_used_insert
+AFTER INSERT ON tagged_images
+BEGIN
+    UPDATE tags SET used = used + 1 WHERE tag_id = NEW.tag_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_used_delete
+AFTER DELETE ON tagged_images
+BEGIN
+    UPDATE tags SET used = used - 1 WHERE tag_id = OLD.tag_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_used_update
+AFTER UPDATE OF tag_id ON tagged_images
+BEGIN
+    UPDATE tags SET used = used - 1 WHERE tag_id = OLD.tag_id;
+    UPDATE tags SET used = used + 1 WHERE tag_id = NEW.tag_id;
+END;
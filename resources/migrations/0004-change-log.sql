@@ -0,0 +1,22 @@
+-- Append-only log of the changes made to the tags, read by the clients to catch up
+
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT,
+    details TEXT NOT NULL,
+    created REAL NOT NULL
+);
+
+-- Finds the changes superseded by a later change of the same value when compacting
+CREATE INDEX IF NOT EXISTS changes_by_key ON changes (key, seq) WHERE key IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS changes_by_created ON changes (created);
+
+-- The clients that have not caught up beyond this sequence number must reload everything
+CREATE TABLE IF NOT EXISTS changes_pruned (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    seq INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO changes_pruned (id, seq) VALUES (1, 0);
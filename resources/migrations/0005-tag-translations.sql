@@ -0,0 +1,28 @@
+-- One table for the translations of the tags in every language, instead of one table per language
+
+CREATE TABLE IF NOT EXISTS tag_translations (
+    tag_id INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    PRIMARY KEY (tag_id, lang)
+) WITHOUT ROWID;
+
+-- The names are unique within a language, like they were in the per-language tables
+CREATE UNIQUE INDEX IF NOT EXISTS tag_translations_by_name ON tag_translations (lang, name);
+
+INSERT OR IGNORE INTO tag_translations (tag_id, lang, name, description)
+SELECT tag_id, 'en', name, description FROM tags_en WHERE tag_id IN (SELECT tag_id FROM tags);
+
+INSERT OR IGNORE INTO tag_translations (tag_id, lang, name, description)
+SELECT tag_id, 'fr', name, description FROM tags_fr WHERE tag_id IN (SELECT tag_id FROM tags);
+
+DROP TABLE tags_en;
+
+DROP TABLE tags_fr;
+
+CREATE TRIGGER IF NOT EXISTS tags_delete_translations
+AFTER DELETE ON tags
+BEGIN
+    DELETE FROM tag_translations WHERE tag_id = OLD.tag_id;
+END;
@@ -0,0 +1,36 @@
+-- Metadata of the image files, read by the index-images command and used to sort and filter them
+
+-- The index of the image files, as created by the schema of the placeholder previews (databases
+-- created by init-db before the migrations existed already have it)
+CREATE TABLE IF NOT EXISTS image_files (
+    file_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fn TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    placeholder TEXT
+);
+
+ALTER TABLE image_files ADD COLUMN width INTEGER;
+
+ALTER TABLE image_files ADD COLUMN height INTEGER;
+
+ALTER TABLE image_files ADD COLUMN orientation INTEGER;
+
+ALTER TABLE image_files ADD COLUMN taken TEXT;
+
+ALTER TABLE image_files ADD COLUMN camera TEXT;
+
+ALTER TABLE image_files ADD COLUMN color TEXT;
+
+CREATE INDEX IF NOT EXISTS image_files_by_width ON image_files (width);
+
+CREATE INDEX IF NOT EXISTS image_files_by_height ON image_files (height);
+
+CREATE INDEX IF NOT EXISTS image_files_by_size ON image_files (size);
+
+CREATE INDEX IF NOT EXISTS image_files_by_taken ON image_files (taken);
+
+CREATE INDEX IF NOT EXISTS image_files_by_camera ON image_files (camera);
+
+-- Forces the next indexing pass to read the metadata of the files indexed before
+UPDATE image_files SET mtime_ns = 0;
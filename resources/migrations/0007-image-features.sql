@@ -0,0 +1,4 @@
+-- Set once the feature vector of the file is stored in the feature matrix of the library (its row
+-- is the file_id), cleared when the file changes. The matrix itself lives next to the database.
+
+ALTER TABLE image_files ADD COLUMN features INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,86 @@
+-- Number of images tagged with both tags of every pair (stored in both directions, so that the
+-- tags seen together with a tag are a range of the primary key), used to suggest tags
+
+CREATE TABLE IF NOT EXISTS tag_pairs (
+    tag_id INTEGER NOT NULL,
+    other_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (tag_id, other_id)
+) WITHOUT ROWID;
+
+-- The suggestions only look at the tags seen the most often with each tag
+CREATE INDEX IF NOT EXISTS tag_pairs_by_count ON tag_pairs (tag_id, count);
+
+-- Totals kept up to date by triggers, read without counting the rows
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY NOT NULL,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT INTO tag_pairs (tag_id, other_id, count)
+SELECT a.tag_id, b.tag_id, COUNT(*)
+FROM tagged_images AS a JOIN tagged_images AS b ON b.image_id = a.image_id AND b.tag_id != a.tag_id
+GROUP BY a.tag_id, b.tag_id;
+
+INSERT OR REPLACE INTO counters (name, value)
+SELECT 'taggedImages', COUNT(DISTINCT image_id) FROM tagged_images;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_pairs_insert
+AFTER INSERT ON tagged_images
+BEGIN
+    UPDATE counters SET value = value + 1
+    WHERE name = 'taggedImages' AND NOT EXISTS (
+        SELECT 1 FROM tagged_images WHERE image_id = NEW.image_id AND tag_id != NEW.tag_id
+    );
+    INSERT INTO tag_pairs (tag_id, other_id, count)
+    SELECT NEW.tag_id, tag_id, 1 FROM tagged_images
+    WHERE image_id = NEW.image_id AND tag_id != NEW.tag_id
+    UNION ALL
+    SELECT tag_id, NEW.tag_id, 1 FROM tagged_images
+    WHERE image_id = NEW.image_id AND tag_id != NEW.tag_id
+    ON CONFLICT (tag_id, other_id) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_pairs_delete
+AFTER DELETE ON tagged_images
+BEGIN
+    UPDATE counters SET value = value - 1
+    WHERE name = 'taggedImages' AND NOT EXISTS (
+        SELECT 1 FROM tagged_images WHERE image_id = OLD.image_id
+    );
+    UPDATE tag_pairs SET count = count - 1
+    WHERE tag_id = OLD.tag_id
+    AND other_id IN (SELECT tag_id FROM tagged_images WHERE image_id = OLD.image_id);
+    UPDATE tag_pairs SET count = count - 1
+    WHERE tag_id IN (SELECT tag_id FROM tagged_images WHERE image_id = OLD.image_id)
+    AND other_id = OLD.tag_id;
+    DELETE FROM tag_pairs WHERE tag_id = OLD.tag_id AND count = 0;
+    DELETE FROM tag_pairs
+    WHERE tag_id IN (SELECT tag_id FROM tagged_images WHERE image_id = OLD.image_id)
+    AND other_id = OLD.tag_id AND count = 0;
+END;
+
+-- Merging tags moves the images of a tag to another one (the images can not already have it)
+CREATE TRIGGER IF NOT EXISTS tagged_images_pairs_update
+AFTER UPDATE OF tag_id ON tagged_images
+BEGIN
+    UPDATE tag_pairs SET count = count - 1
+    WHERE tag_id = OLD.tag_id
+    AND other_id IN (SELECT tag_id FROM tagged_images WHERE image_id = NEW.image_id
+                     AND tag_id != NEW.tag_id);
+    UPDATE tag_pairs SET count = count - 1
+    WHERE tag_id IN (SELECT tag_id FROM tagged_images WHERE image_id = NEW.image_id
+                     AND tag_id != NEW.tag_id)
+    AND other_id = OLD.tag_id;
+    DELETE FROM tag_pairs WHERE tag_id = OLD.tag_id AND count = 0;
+    DELETE FROM tag_pairs
+    WHERE tag_id IN (SELECT tag_id FROM tagged_images WHERE image_id = NEW.image_id)
+    AND other_id = OLD.tag_id AND count = 0;
+    INSERT INTO tag_pairs (tag_id, other_id, count)
+    SELECT NEW.tag_id, tag_id, 1 FROM tagged_images
+    WHERE image_id = NEW.image_id AND tag_id != NEW.tag_id
+    UNION ALL
+    SELECT tag_id, NEW.tag_id, 1 FROM tagged_images
+    WHERE image_id = NEW.image_id AND tag_id != NEW.tag_id
+    ON CONFLICT (tag_id, other_id) DO UPDATE SET count = count + 1;
+END;
@@ -0,0 +1,61 @@
+-- Number of tags of every image file, kept up to date by triggers, so that the files with few or
+-- no tags are a range of an index (the images table only lists the files that were ever tagged)
+
+ALTER TABLE image_files ADD COLUMN tag_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE image_files SET tag_count = (
+    SELECT COUNT(*) FROM images JOIN tagged_images USING (image_id)
+    WHERE images.fn = image_files.fn
+);
+
+CREATE INDEX IF NOT EXISTS image_files_by_tag_count ON image_files (tag_count, fn);
+
+-- Number of image files by number of tags, the progress of the tagging without counting rows
+CREATE TABLE IF NOT EXISTS file_tag_counts (
+    tag_count INTEGER PRIMARY KEY NOT NULL,
+    files INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT INTO file_tag_counts (tag_count, files)
+SELECT tag_count, COUNT(*) FROM image_files GROUP BY tag_count;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_tag_count_insert
+AFTER INSERT ON tagged_images
+BEGIN
+    UPDATE image_files SET tag_count = tag_count + 1
+    WHERE fn = (SELECT fn FROM images WHERE image_id = NEW.image_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_tag_count_delete
+AFTER DELETE ON tagged_images
+BEGIN
+    UPDATE image_files SET tag_count = tag_count - 1
+    WHERE fn = (SELECT fn FROM images WHERE image_id = OLD.image_id);
+END;
+
+-- A file added (again) to the folder keeps the tags given to it before
+CREATE TRIGGER IF NOT EXISTS image_files_tag_count_insert
+AFTER INSERT ON image_files
+BEGIN
+    INSERT INTO file_tag_counts (tag_count, files) VALUES (NEW.tag_count, 1)
+    ON CONFLICT (tag_count) DO UPDATE SET files = files + 1;
+    UPDATE image_files SET tag_count = (
+        SELECT COUNT(*) FROM images JOIN tagged_images USING (image_id) WHERE images.fn = NEW.fn
+    )
+    WHERE file_id = NEW.file_id AND EXISTS (SELECT 1 FROM images WHERE fn = NEW.fn);
+END;
+
+CREATE TRIGGER IF NOT EXISTS image_files_tag_count_update
+AFTER UPDATE OF tag_count ON image_files
+WHEN OLD.tag_count != NEW.tag_count
+BEGIN
+    UPDATE file_tag_counts SET files = files - 1 WHERE tag_count = OLD.tag_count;
+    INSERT INTO file_tag_counts (tag_count, files) VALUES (NEW.tag_count, 1)
+    ON CONFLICT (tag_count) DO UPDATE SET files = files + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS image_files_tag_count_delete
+AFTER DELETE ON image_files
+BEGIN
+    UPDATE file_tag_counts SET files = files - 1 WHERE tag_count = OLD.tag_count;
+END;
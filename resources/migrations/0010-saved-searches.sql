@@ -0,0 +1,161 @@
+-- Named searches (images with all the required tags and none of the excluded ones) whose results
+-- are kept in saved_search_images by triggers, instead of being searched again every time
+
+CREATE TABLE IF NOT EXISTS saved_searches (
+    search_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    -- Number of required tags, an image matches when it has as many of them (none when there
+    -- are none left, after all of them were deleted)
+    required INTEGER NOT NULL,
+    -- Number of images, and of changes of the results or of the tags of the search: the version is
+    -- used as a cache validator
+    size INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS saved_search_tags (
+    search_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    excluded INTEGER NOT NULL,
+    PRIMARY KEY (search_id, tag_id)
+) WITHOUT ROWID;
+
+-- Finds the searches to update when the tags of an image change
+CREATE INDEX IF NOT EXISTS saved_search_tags_by_tag ON saved_search_tags (tag_id);
+
+CREATE TABLE IF NOT EXISTS saved_search_images (
+    search_id INTEGER NOT NULL,
+    image_id INTEGER NOT NULL,
+    PRIMARY KEY (search_id, image_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS saved_search_images_insert
+AFTER INSERT ON saved_search_images
+BEGIN
+    UPDATE saved_searches SET size = size + 1, version = version + 1
+    WHERE search_id = NEW.search_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS saved_search_images_delete
+AFTER DELETE ON saved_search_images
+BEGIN
+    UPDATE saved_searches SET size = size - 1, version = version + 1
+    WHERE search_id = OLD.search_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS saved_searches_delete
+AFTER DELETE ON saved_searches
+BEGIN
+    DELETE FROM saved_search_tags WHERE search_id = OLD.search_id;
+    DELETE FROM saved_search_images WHERE search_id = OLD.search_id;
+END;
+
+-- Only the membership of the changed image in the searches using the changed tag is checked again
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_saved_searches_insert
+AFTER INSERT ON tagged_images
+BEGIN
+    DELETE FROM saved_search_images
+    WHERE image_id = NEW.image_id AND search_id IN (
+        SELECT s.search_id FROM saved_search_tags AS st
+        JOIN saved_searches AS s ON s.search_id = st.search_id
+        WHERE st.tag_id = NEW.tag_id AND NOT (
+            s.required > 0 AND s.required = (
+                SELECT COUNT(*) FROM saved_search_tags AS r
+                JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = NEW.image_id
+                WHERE r.search_id = s.search_id AND r.excluded = 0
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM saved_search_tags AS r
+                JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = NEW.image_id
+                WHERE r.search_id = s.search_id AND r.excluded = 1
+            )
+        )
+    );
+    INSERT OR IGNORE INTO saved_search_images (search_id, image_id)
+    SELECT s.search_id, NEW.image_id FROM saved_search_tags AS st
+    JOIN saved_searches AS s ON s.search_id = st.search_id
+    WHERE st.tag_id = NEW.tag_id
+    AND s.required > 0 AND s.required = (
+        SELECT COUNT(*) FROM saved_search_tags AS r
+        JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = NEW.image_id
+        WHERE r.search_id = s.search_id AND r.excluded = 0
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM saved_search_tags AS r
+        JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = NEW.image_id
+        WHERE r.search_id = s.search_id AND r.excluded = 1
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_saved_searches_delete
+AFTER DELETE ON tagged_images
+BEGIN
+    DELETE FROM saved_search_images
+    WHERE image_id = OLD.image_id AND search_id IN (
+        SELECT s.search_id FROM saved_search_tags AS st
+        JOIN saved_searches AS s ON s.search_id = st.search_id
+        WHERE st.tag_id = OLD.tag_id AND NOT (
+            s.required > 0 AND s.required = (
+                SELECT COUNT(*) FROM saved_search_tags AS r
+                JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = OLD.image_id
+                WHERE r.search_id = s.search_id AND r.excluded = 0
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM saved_search_tags AS r
+                JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = OLD.image_id
+                WHERE r.search_id = s.search_id AND r.excluded = 1
+            )
+        )
+    );
+    INSERT OR IGNORE INTO saved_search_images (search_id, image_id)
+    SELECT s.search_id, OLD.image_id FROM saved_search_tags AS st
+    JOIN saved_searches AS s ON s.search_id = st.search_id
+    WHERE st.tag_id = OLD.tag_id
+    AND s.required > 0 AND s.required = (
+        SELECT COUNT(*) FROM saved_search_tags AS r
+        JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = OLD.image_id
+        WHERE r.search_id = s.search_id AND r.excluded = 0
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM saved_search_tags AS r
+        JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = OLD.image_id
+        WHERE r.search_id = s.search_id AND r.excluded = 1
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_saved_searches_update
+AFTER UPDATE OF tag_id ON tagged_images
+BEGIN
+    DELETE FROM saved_search_images
+    WHERE image_id = NEW.image_id AND search_id IN (
+        SELECT s.search_id FROM saved_search_tags AS st
+        JOIN saved_searches AS s ON s.search_id = st.search_id
+        WHERE st.tag_id IN (OLD.tag_id, NEW.tag_id) AND NOT (
+            s.required > 0 AND s.required = (
+                SELECT COUNT(*) FROM saved_search_tags AS r
+                JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = NEW.image_id
+                WHERE r.search_id = s.search_id AND r.excluded = 0
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM saved_search_tags AS r
+                JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = NEW.image_id
+                WHERE r.search_id = s.search_id AND r.excluded = 1
+            )
+        )
+    );
+    INSERT OR IGNORE INTO saved_search_images (search_id, image_id)
+    SELECT s.search_id, NEW.image_id FROM saved_search_tags AS st
+    JOIN saved_searches AS s ON s.search_id = st.search_id
+    WHERE st.tag_id IN (OLD.tag_id, NEW.tag_id)
+    AND s.required > 0 AND s.required = (
+        SELECT COUNT(*) FROM saved_search_tags AS r
+        JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = NEW.image_id
+        WHERE r.search_id = s.search_id AND r.excluded = 0
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM saved_search_tags AS r
+        JOIN tagged_images AS ti ON ti.tag_id = r.tag_id AND ti.image_id = NEW.image_id
+        WHERE r.search_id = s.search_id AND r.excluded = 1
+    );
+END;
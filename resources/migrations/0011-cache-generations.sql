@@ -0,0 +1,83 @@
+-- Generation of every group of tables (cache namespace), bumped by every write to them. The
+-- processes caching data read from a namespace compare its generation to notice the changes made
+-- by the other processes.
+
+CREATE TABLE IF NOT EXISTS cache_generations (
+    namespace TEXT PRIMARY KEY NOT NULL,
+    generation INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO cache_generations (namespace, generation)
+VALUES ('tags', 0), ('taggedImages', 0), ('imageFiles', 0);
+
+CREATE TRIGGER IF NOT EXISTS tags_generation_insert
+AFTER INSERT ON tags
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'tags';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tags_generation_update
+AFTER UPDATE ON tags
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'tags';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tags_generation_delete
+AFTER DELETE ON tags
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'tags';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tag_translations_generation_insert
+AFTER INSERT ON tag_translations
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'tags';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tag_translations_generation_update
+AFTER UPDATE ON tag_translations
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'tags';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tag_translations_generation_delete
+AFTER DELETE ON tag_translations
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'tags';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_generation_insert
+AFTER INSERT ON tagged_images
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'taggedImages';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_generation_update
+AFTER UPDATE ON tagged_images
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'taggedImages';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tagged_images_generation_delete
+AFTER DELETE ON tagged_images
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'taggedImages';
+END;
+
+CREATE TRIGGER IF NOT EXISTS image_files_generation_insert
+AFTER INSERT ON image_files
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'imageFiles';
+END;
+
+CREATE TRIGGER IF NOT EXISTS image_files_generation_update
+AFTER UPDATE ON image_files
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'imageFiles';
+END;
+
+CREATE TRIGGER IF NOT EXISTS image_files_generation_delete
+AFTER DELETE ON image_files
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'imageFiles';
+END;
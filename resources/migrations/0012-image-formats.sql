@@ -0,0 +1,8 @@
+-- Format of the image files, recognized by index-images from the signature in their header
+-- (NULL until the file is indexed again, '' when no signature matches). Files with content that
+-- is not in an enabled format are left out of the listings.
+
+ALTER TABLE image_files ADD COLUMN format TEXT;
+
+-- Forces the next indexing pass to recognize the format of the files indexed before
+UPDATE image_files SET mtime_ns = 0;
@@ -0,0 +1,28 @@
+-- The generations are only bumped by the columns the cached values are read from. Tagging an
+-- image updates tags.used and image_files.tag_count: the usage counts of the tags get a namespace
+-- of their own, and the listings of the image files no longer depend on the tagging.
+
+INSERT OR IGNORE INTO cache_generations (namespace, generation) VALUES ('tagUsage', 0);
+
+DROP TRIGGER IF EXISTS tags_generation_update;
+
+CREATE TRIGGER IF NOT EXISTS tags_generation_update
+AFTER UPDATE OF tag_id, name, description, lang ON tags
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'tags';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tags_usage_generation_update
+AFTER UPDATE OF used ON tags
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'tagUsage';
+END;
+
+DROP TRIGGER IF EXISTS image_files_generation_update;
+
+CREATE TRIGGER IF NOT EXISTS image_files_generation_update
+AFTER UPDATE OF fn, mtime_ns, size, format, placeholder, width, height, orientation, taken,
+    camera, color ON image_files
+BEGIN
+    UPDATE cache_generations SET generation = generation + 1 WHERE namespace = 'imageFiles';
+END;
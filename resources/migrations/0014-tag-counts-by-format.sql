@@ -0,0 +1,51 @@
+-- The tagging progress only counts the files the listings show: the number of image files by
+-- number of tags is kept for every format, and summed over the enabled formats. The files not
+-- recognized yet (NULL format, listed by their extension) are counted under '?'.
+
+DROP TRIGGER IF EXISTS image_files_tag_count_insert;
+DROP TRIGGER IF EXISTS image_files_tag_count_update;
+DROP TRIGGER IF EXISTS image_files_tag_count_delete;
+DROP TABLE IF EXISTS file_tag_counts;
+
+CREATE TABLE file_tag_counts (
+    format TEXT NOT NULL,
+    tag_count INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    PRIMARY KEY (format, tag_count)
+) WITHOUT ROWID;
+
+INSERT INTO file_tag_counts (format, tag_count, files)
+SELECT COALESCE(format, '?'), tag_count, COUNT(*) FROM image_files
+GROUP BY COALESCE(format, '?'), tag_count;
+
+-- A file added (again) to the folder keeps the tags given to it before
+CREATE TRIGGER IF NOT EXISTS image_files_tag_count_insert
+AFTER INSERT ON image_files
+BEGIN
+    INSERT INTO file_tag_counts (format, tag_count, files)
+    VALUES (COALESCE(NEW.format, '?'), NEW.tag_count, 1)
+    ON CONFLICT (format, tag_count) DO UPDATE SET files = files + 1;
+    UPDATE image_files SET tag_count = (
+        SELECT COUNT(*) FROM images JOIN tagged_images USING (image_id) WHERE images.fn = NEW.fn
+    )
+    WHERE file_id = NEW.file_id AND EXISTS (SELECT 1 FROM images WHERE fn = NEW.fn);
+END;
+
+-- Indexing the file again may recognize another format
+CREATE TRIGGER IF NOT EXISTS image_files_tag_count_update
+AFTER UPDATE OF tag_count, format ON image_files
+WHEN OLD.tag_count != NEW.tag_count OR OLD.format IS NOT NEW.format
+BEGIN
+    UPDATE file_tag_counts SET files = files - 1
+    WHERE format = COALESCE(OLD.format, '?') AND tag_count = OLD.tag_count;
+    INSERT INTO file_tag_counts (format, tag_count, files)
+    VALUES (COALESCE(NEW.format, '?'), NEW.tag_count, 1)
+    ON CONFLICT (format, tag_count) DO UPDATE SET files = files + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS image_files_tag_count_delete
+AFTER DELETE ON image_files
+BEGIN
+    UPDATE file_tag_counts SET files = files - 1
+    WHERE format = COALESCE(OLD.format, '?') AND tag_count = OLD.tag_count;
+END;
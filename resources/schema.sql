@@ -1,36 +1,19 @@
+-- Drops everything, the tables are (re)created by the scripts in resources/migrations
 DROP TABLE IF EXISTS images;
 DROP TABLE IF EXISTS tagged_images;
 DROP TABLE IF EXISTS tags;
 DROP TABLE IF EXISTS tags_en;
 DROP TABLE IF EXISTS tags_fr;
+DROP TABLE IF EXISTS tag_translations;
+DROP TABLE IF EXISTS image_files;
+DROP TABLE IF EXISTS changes;
+DROP TABLE IF EXISTS changes_pruned;
+DROP TABLE IF EXISTS tag_pairs;
+DROP TABLE IF EXISTS counters;
+DROP TABLE IF EXISTS file_tag_counts;
+DROP TABLE IF EXISTS saved_searches;
+DROP TABLE IF EXISTS saved_search_tags;
+DROP TABLE IF EXISTS saved_search_images;
+DROP TABLE IF EXISTS cache_generations;
 
-CREATE TABLE images (
-    image_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    fn TEXT UNIQUE NOT NULL
-);
-
-CREATE TABLE tagged_images (
-    image_id INTEGER NOT NULL,
-    tag_id INTEGER NOT NULL,
-    PRIMARY KEY (image_id, tag_id)
-);
-
-CREATE TABLE tags (
-    tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT UNIQUE NOT NULL,
-    description TEXT,
-    used INTEGER,
-    lang TEXT NOT NULL
-);
-
-CREATE TABLE tags_en (
-    tag_id INTEGER PRIMARY KEY NOT NULL,
-    name TEXT UNIQUE NOT NULL,
-    description TEXT
-);
-
-CREATE TABLE tags_fr (
-    tag_id INTEGER PRIMARY KEY NOT NULL,
-    name TEXT UNIQUE NOT NULL,
-    description TEXT
-);
+PRAGMA user_version = 0;
@@ -7,6 +7,7 @@ window.onload = () => {
     initFilterTags();
 
     const images = [];
+    const placeholders = new Map();
     const tags = [];
     const tagFilter = {
         "name": null
@@ -23,6 +24,53 @@ window.onload = () => {
         });
     }
 
+    function receiveImages(list) {
+        images.length = 0;
+        for (const { fn, placeholder } of list) {
+            images.push(fn);
+            if (placeholder) {
+                placeholders.set(fn, placeholder);
+            }
+        }
+    }
+
+    // The images the pager shows next are named in the URL, the server prepares them in advance
+    function imageUrl(fn, thumbnail = false, prefetch = []) {
+        const neighbours = prefetch.map(next => `&prefetch=${encodeURIComponent(next)}`).join("");
+        return `${config.urls.loadImage}&fn=${encodeURIComponent(fn)}${thumbnail ? "&tn=true" : ""}${neighbours}`;
+    }
+
+    function imageBackground(fn, thumbnail = false, prefetch = []) {
+        const url = imageUrl(fn, thumbnail, prefetch);
+        const placeholder = placeholders.get(fn);
+
+        // The placeholder layer shows through until the image itself is loaded
+        return placeholder ? `url("${url}"), url("${placeholder}")` : `url("${url}")`;
+    }
+
+    function followChanges(receive, since = null) {
+        const url = new URL(config.urls.changeFeed, location.href);
+        if (since !== null) {
+            url.searchParams.set("since", since);
+        }
+        const feed = new EventSource(url);
+
+        for (const type of ["tagCreated", "tagUpdated", "tagsMerged", "tagsRemoved", "imageTagsUpdated"]) {
+            feed.addEventListener(type, e => {
+                since = e.lastEventId;
+                receive({ type: type, details: JSON.parse(e.data) });
+            });
+        }
+        // The changes we missed were already removed from the log, only a reload can catch up
+        feed.addEventListener("reset", () => location.reload());
+        // Refused while the server has no stream to spare, the browser does not retry by itself
+        feed.addEventListener("error", () => {
+            if (feed.readyState === EventSource.CLOSED) {
+                setTimeout(() => followChanges(receive, since), 30000 + Math.random() * 30000);
+            }
+        });
+    }
+
     function reorderTags() {
         const container = document.getElementById("tagsContainer");
         
@@ -254,9 +302,18 @@ window.onload = () => {
 
         container.replaceChildren(fragment);
 
-        receiveChannel.onmessage = e => {
+        function receiveChange({ type, details }) {
+
+            if (type === "tagCreated") {
+                if (tags.some(t => t.id === details.id)) {
+                    return;
+                }
+                tags.push(details);
+                const maxUsed = Math.max(...tags.map(t => t.used));
+                container.appendChild(buildContainerTag(details, maxUsed));
+                reorderTags();
+            }
 
-            const { type, details } = e.data;
             if (type === "tagsRemoved" && details.status === "success") {
                 for (const tagId of details.removed) {
                     const ix = tags.findIndex(t => t.id == tagId);
@@ -292,6 +349,15 @@ window.onload = () => {
                 reorderTags();
             }
 
+            if (type === "tagUpdated" && details.field === "used") {
+                const updated = tags.find(t => t.id === details.tagId);
+                if (!updated || updated.used === details.newValue) {
+                    return;
+                }
+                updated.used = details.newValue;
+                reorderTags();
+            }
+
             if (type === "tagUpdated" && details.lang == config.lang) {
                 const updated = tags.find(t => t.id === details.tagId);
                 if (!updated) {
@@ -309,10 +375,33 @@ window.onload = () => {
                 el.replaceChildren(infoIcon, document.createTextNode(details.newValue));
                 reorderTags();
             }
-        };
+
+            if (type === "imageTagsUpdated") {
+                const index = parseInt(document.getElementById("pagerCrt").textContent) - 1;
+                // Local changes waiting to be sent win over the ones made elsewhere
+                if (images[index] === details.fn && !pending[details.fn]) {
+                    for (const input of container.querySelectorAll("input")) {
+                        input.checked = details.tags.indexOf(parseInt(input.closest('.tag-wrapper').dataset["tagId"])) >= 0;
+                    }
+                    loadSuggestedTags();
+                }
+                document.dispatchEvent(new CustomEvent("tagsUpdated", { detail: details }));
+            }
+        }
+
+        receiveChannel.onmessage = e => receiveChange(e.data);
+        followChanges(receiveChange);
 
         loadImageTags();
 
+        // Picking a suggestion checks the tag in the list, saved like any other change
+        document.getElementById("suggestedTags").addEventListener("click", (e) => {
+            const suggestion = e.target.closest(".suggested-tag");
+            if (suggestion) {
+                document.getElementById(`tag_${suggestion.dataset["tagId"]}`).click();
+            }
+        });
+
         let top = null;
         let pending = {};
 
@@ -340,6 +429,7 @@ window.onload = () => {
                 });
             }
             reorderTags();
+            loadSuggestedTags();
 
             if (!pending[fileName]) {
                 pending[fileName] = [tagId];
@@ -405,7 +495,7 @@ window.onload = () => {
                 hoverId = hid;
             }
 
-            const respPromise = fetch(config.urls.tagInfo.concat("?tag=", encodeURIComponent(hoverId)));
+            const respPromise = fetch(config.urls.tagInfo.concat("&tag=", encodeURIComponent(hoverId), "&placeholders=true"));
             let flyout = document.getElementById('flyout');
 
             tof = setTimeout(async () => {
@@ -437,10 +527,13 @@ window.onload = () => {
                     document.body.appendChild(flyout);
                 }
 
-                flyout.querySelector('.sample-images').replaceChildren(...info.images.map(fn => {
+                flyout.querySelector('.sample-images').replaceChildren(...info.images.map(({ fn, placeholder }) => {
                     const img = document.createElement('div');
                     img.classList.add('sample-image');
-                    img.style.backgroundImage = `url("${config.urls.loadImage}?fn=${encodeURIComponent(fn)}&tn=true")`;
+                    if (placeholder) {
+                        placeholders.set(fn, placeholder);
+                    }
+                    img.style.backgroundImage = imageBackground(fn, true);
 
                     return img;
                 }));
@@ -535,12 +628,61 @@ window.onload = () => {
         return div;
     }
 
+    let suggestionsTimeout = null, suggestionsRequest = 0;
+    function loadSuggestedTags() {
+
+        // Checking several tags in a row only asks for the suggestions once
+        if (suggestionsTimeout) {
+            clearTimeout(suggestionsTimeout);
+        }
+
+        suggestionsTimeout = setTimeout(async () => {
+
+            suggestionsTimeout = null;
+            const request = ++suggestionsRequest;
+            const strip = document.getElementById("suggestedTags");
+            const checked = Array.from(
+                document.querySelectorAll("#tagsContainer input:checked")
+            ).map(
+                input => input.closest('.tag-wrapper').dataset["tagId"]
+            );
+
+            if (checked.length === 0) {
+                strip.replaceChildren();
+                return;
+            }
+
+            const resp = await fetch(config.urls.suggestTags.concat("&tags=", checked.join(",")));
+
+            // The suggestions are only a shortcut, the tags can still be picked from the list
+            if (!resp.ok || request !== suggestionsRequest) {
+                return;
+            }
+
+            const fragment = document.createDocumentFragment();
+            for (const { id } of await resp.json()) {
+                const tag = tags.find(t => t.id === id);
+                if (!tag) {
+                    continue;
+                }
+                const button = document.createElement("button");
+                button.setAttribute("type", "button");
+                button.className = "suggested-tag";
+                button.dataset["tagId"] = id.toFixed(0);
+                button.textContent = tag.name;
+                fragment.appendChild(button);
+            }
+
+            strip.replaceChildren(fragment);
+        }, 250);
+    }
+
     async function loadImageTags() {
 
         const index = parseInt(document.getElementById("pagerCrt").textContent) - 1;
         const fn = images[index];
 
-        const resp = await fetch(config.urls.imageTags.concat("?fn=", encodeURIComponent(fn)));
+        const resp = await fetch(config.urls.imageTags.concat("&fn=", encodeURIComponent(fn)));
 
         if (!resp.ok) {
             if (resp.headers.get("Content-Type").startsWith("application/json")) {
@@ -562,12 +704,14 @@ window.onload = () => {
 
             input.checked = imageTags.indexOf(parseInt(input.closest('.tag-wrapper').dataset["tagId"])) >= 0;
         }
+
+        loadSuggestedTags();
     }
 
     const crtImgProp = { naturalWidth: 0, naturalHeight: 0 };
     async function initImageViewer() {
 
-        const resp = await fetch(config.urls.images);
+        const resp = await fetch(config.urls.images.concat("&placeholders=true"));
 
         if (!resp.ok) {
             if (resp.headers.get("Content-Type").startsWith("application/json")) {
@@ -579,8 +723,7 @@ window.onload = () => {
             return;
         }
 
-        images.length = 0;
-        images.push(...await resp.json());
+        receiveImages(await resp.json());
 
         const viewer = document.getElementById('imageContainer');
 
@@ -589,9 +732,9 @@ window.onload = () => {
         document.getElementById('pagerPrevious').disabled = true;
         document.getElementById('pagerNext').disabled = images.length < 2;
 
-        const imageUrl = `${config.urls.loadImage}?fn=${encodeURIComponent(images[0])}`;
+        const imageUrl = `${config.urls.loadImage}&fn=${encodeURIComponent(images[0])}`;
 
-        viewer.style.backgroundImage = `url("${imageUrl}")`;
+        viewer.style.backgroundImage = imageBackground(images[0]);
 
         // Zoom in on mouse move
         viewer.addEventListener("mousemove", (ev) => {
@@ -671,11 +814,23 @@ window.onload = () => {
         const imageContainer = document.getElementById('imageContainer');
         const jump = document.getElementById('pagerJump');
 
-        const changeImage = (imageUrl) => {
-            imageContainer.style.backgroundImage = `url("${imageUrl}")`;
+        // Browsing in a direction (1 or -1), the next images of the list in that direction and the
+        // previous one are prepared in advance. The same URL is loaded and measured, once.
+        const changeImage = (index, direction) => {
+            const fn = images[index];
+            const prefetch = [];
+            if (direction) {
+                for (let i = 1; i <= config.prefetchDepth; i++) {
+                    prefetch.push(images[index + direction * i]);
+                }
+                prefetch.push(images[index - direction]);
+            }
+            const neighbours = prefetch.filter(next => next !== undefined);
+
+            imageContainer.style.backgroundImage = imageBackground(fn, false, neighbours);
 
             const img = new Image();
-            img.src = imageUrl;
+            img.src = imageUrl(fn, false, neighbours);
             img.onload = () => {
                 crtImgProp.naturalWidth = img.naturalWidth;
                 crtImgProp.naturalHeight = img.naturalHeight;
@@ -686,7 +841,7 @@ window.onload = () => {
 
             const index = parseInt(crt.textContent);
 
-            changeImage(`${config.urls.loadImage}?fn=${encodeURIComponent(images[index])}`);
+            changeImage(index, 1);
 
             crt.textContent = (index + 1).toFixed(0);
 
@@ -701,7 +856,7 @@ window.onload = () => {
 
             const index = parseInt(crt.textContent) - 2;
 
-            changeImage(`${config.urls.loadImage}?fn=${encodeURIComponent(images[index])}`);
+            changeImage(index, -1);
 
             crt.textContent = (index + 1).toFixed(0);
 
@@ -712,6 +867,82 @@ window.onload = () => {
             loadImageTags();
         });
 
+        const untagged = document.getElementById('pagerUntagged');
+
+        // Pages through the untagged images after `after`, until one of them is in the list
+        async function findUntagged(after, until = null) {
+
+            while (true) {
+                const resp = await fetch(config.urls.untaggedImages.concat("&limit=50&after=", encodeURIComponent(after)));
+
+                if (!resp.ok) {
+                    if (resp.headers.get("Content-Type").startsWith("application/json")) {
+                        const info = await resp.json();
+                        alertDialog(info.reason);
+                    } else {
+                        alertDialog(formatMessage("GENERIC_COMMUNICATION_ERROR"))
+                    }
+                    return null;
+                }
+
+                const { images: found, progress } = await resp.json();
+                untagged.title = formatMessage("pager.untaggedProgress", progress);
+
+                // The search results may not list all of them
+                for (const fn of found) {
+                    if (fn === until) {
+                        return -1;
+                    }
+                    const index = images.indexOf(fn);
+                    if (index >= 0) {
+                        return index;
+                    }
+                }
+
+                if (found.length === 0) {
+                    return -1;
+                }
+                after = found[found.length - 1];
+            }
+        }
+
+        untagged.addEventListener('click', async () => {
+
+            const fn = images[parseInt(crt.textContent) - 1];
+
+            untagged.disabled = true;
+            // The images after the current one first, then the ones before it
+            let index = await findUntagged(fn);
+            if (index === -1) {
+                index = await findUntagged("", fn);
+            }
+            untagged.disabled = false;
+
+            if (index === null) {
+                return;
+            }
+            if (index === -1) {
+                alertDialog(formatMessage("pager.allTagged"), true);
+                return;
+            }
+
+            changeImage(index);
+
+            crt.textContent = (index + 1).toFixed(0);
+
+            previous.disabled = index <= 0;
+            next.disabled = index + 1 >= images.length;
+            jump.disabled = !jump.dataset["latest"] || images[index] === jump.dataset["latest"] || images.indexOf(jump.dataset["latest"]) < 0;
+
+            loadImageTags();
+        });
+
+        fetch(config.urls.untaggedImages.concat("&limit=0")).then(async resp => {
+            if (resp.ok) {
+                untagged.title = formatMessage("pager.untaggedProgress", (await resp.json()).progress);
+            }
+        });
+
         const resp = await fetch(config.urls.latest);
 
         if (!resp.ok) {
@@ -736,7 +967,7 @@ window.onload = () => {
 
             const index = images.indexOf(latest.fn);
             
-            changeImage(`${config.urls.loadImage}?fn=${encodeURIComponent(images[index])}`);
+            changeImage(index);
 
             crt.textContent = (index + 1).toFixed(0);
 
@@ -992,7 +1223,7 @@ window.onload = () => {
                 next.disabled = (newIndex + 1) >= images.length;
 
                 if (index === crtIndex) {
-                    imageContainer.style.backgroundImage = 'url("'.concat(config.urls.loadImage, '?fn=', encodeURIComponent(images[newIndex]), '")');
+                    imageContainer.style.backgroundImage = imageBackground(images[newIndex]);
                     loadImageTags();
                 }
             }
@@ -1014,7 +1245,7 @@ window.onload = () => {
                 const formData = new FormData();
                 formData.append('tags', JSON.stringify(tagIds));
 
-                const resp = await fetch(config.urls.searchImages, { method: 'POST', body: formData });
+                const resp = await fetch(config.urls.searchImages.concat("&placeholders=true"), { method: 'POST', body: formData });
 
                 if (!resp.ok) {
                     if (resp.headers.get("Content-Type").startsWith("application/json")) {
@@ -1026,13 +1257,12 @@ window.onload = () => {
                     return;
                 }
 
-                images.length = 0;
-                images.push(...await resp.json());
+                receiveImages(await resp.json());
 
                 jump.disabled = true;
             } else {
 
-                const resp = await fetch(config.urls.images);
+                const resp = await fetch(config.urls.images.concat("&placeholders=true"));
 
                 if (!resp.ok) {
                     if (resp.headers.get("Content-Type").startsWith("application/json")) {
@@ -1044,8 +1274,7 @@ window.onload = () => {
                     return;
                 }
 
-                images.length = 0;
-                images.push(...await resp.json());
+                receiveImages(await resp.json());
 
                 jump.disabled = !jump.dataset["latest"] || images[0] === jump.dataset["latest"] || images.indexOf(jump.dataset["latest"]) < 0;
             }
@@ -1056,7 +1285,7 @@ window.onload = () => {
                 crt.textContent = '1';
                 previous.disabled = true;
                 next.disabled = images.length < 2;
-                imageContainer.style.backgroundImage = 'url("'.concat(config.urls.loadImage, '?fn=', encodeURIComponent(images[0]), '")');
+                imageContainer.style.backgroundImage = imageBackground(images[0]);
             } else {
                 crt.textContent = (newIndex + 1).toFixed(0);
                 previous.disabled = newIndex <= 0;
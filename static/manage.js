@@ -36,7 +36,7 @@ window.onload = () => {
         const imgDiv = document.createElement('div');
         imgDiv.className = 'tag-images';
 
-        const resp = await fetch(`${config.urls.tagInfo}?tag=${tag.id}`);
+        const resp = await fetch(`${config.urls.tagInfo}&tag=${tag.id}`);
 
         if (!resp.ok) {
             if (resp.headers.get("Content-Type").startsWith("application/json")) {
@@ -56,7 +56,7 @@ window.onload = () => {
 
         for (const fn of info.images) {
             const img = document.createElement('div');
-            img.style.backgroundImage = `url("${config.urls.loadImage}?fn=${encodeURIComponent(fn)}&tn=true")`;
+            img.style.backgroundImage = `url("${config.urls.loadImage}&fn=${encodeURIComponent(fn)}&tn=true")`;
             imgDiv.appendChild(img);
         }
 
@@ -65,14 +65,23 @@ window.onload = () => {
         return row;
     }
 
-    receiveChannel.onmessage = async e => {
+    async function receiveChange({ type, details }) {
 
-        console.log("received:", e.data);
-        const { type, details } = e.data;
         if (type === "tagCreated") {
+            if (container.querySelector(`div[data-tag-id="${details.id}"]`)) {
+                return;
+            }
             const row = await buildTagRow(details);
             container.appendChild(row);
         }
+        if (type === "tagsRemoved" || type === "tagsMerged") {
+            for (const tagId of details.removed) {
+                const row = container.querySelector(`div[data-tag-id="${tagId}"]`);
+                if (row) {
+                    row.remove();
+                }
+            }
+        }
         if (type === "tagUpdated") {
             if (details.field === "name" && details.lang == config.lang) {
                 const el = container.querySelector(`div[data-tag-id="${details.tagId}"] .tag-name`);
@@ -94,7 +103,7 @@ window.onload = () => {
                 el.dataset["used"] = details.newValue.toFixed(0);
                 fixOrder(el, details.newValue, (el.matches('.editing') ? el.querySelector('input').value : el.textContent));
 
-                const resp = await fetch(`${config.urls.tagInfo}?tag=${details.tagId}`);
+                const resp = await fetch(`${config.urls.tagInfo}&tag=${details.tagId}`);
 
                 if (!resp.ok) {
                     if (resp.headers.get("Content-Type").startsWith("application/json")) {
@@ -109,7 +118,7 @@ window.onload = () => {
                 const info = await resp.json();
                 el.parentNode.querySelector('.tag-images').replaceChildren(...info.images.map(fn => {
                     const img = document.createElement('div');
-                    img.style.backgroundImage = `url("${config.urls.loadImage}?fn=${encodeURIComponent(fn)}&tn=true")`;
+                    img.style.backgroundImage = `url("${config.urls.loadImage}&fn=${encodeURIComponent(fn)}&tn=true")`;
                     return img;
                 }));
             }
@@ -144,7 +153,33 @@ window.onload = () => {
             }
             container.insertBefore(tagNameElement.parentNode, nextRow);
         }
-    };
+    }
+
+    receiveChannel.onmessage = e => receiveChange(e.data);
+    followChanges(receiveChange);
+
+    function followChanges(receive, since = null) {
+        const url = new URL(config.urls.changeFeed, location.href);
+        if (since !== null) {
+            url.searchParams.set("since", since);
+        }
+        const feed = new EventSource(url);
+
+        for (const type of ["tagCreated", "tagUpdated", "tagsMerged", "tagsRemoved"]) {
+            feed.addEventListener(type, e => {
+                since = e.lastEventId;
+                receive({ type: type, details: JSON.parse(e.data) });
+            });
+        }
+        // The changes we missed were already removed from the log, only a reload can catch up
+        feed.addEventListener("reset", () => location.reload());
+        // Refused while the server has no stream to spare, the browser does not retry by itself
+        feed.addEventListener("error", () => {
+            if (feed.readyState === EventSource.CLOSED) {
+                setTimeout(() => followChanges(receive, since), 30000 + Math.random() * 30000);
+            }
+        });
+    }
 
     function makeEditable(element, field, tagId) {
 
@@ -278,7 +313,7 @@ window.onload = () => {
         selected.length = 0;
 
         const updateKept = async (tagId) => {
-            const resp = await fetch(`${config.urls.tagInfo}?tag=${tagId}`);
+            const resp = await fetch(`${config.urls.tagInfo}&tag=${tagId}`);
 
             if (!resp.ok) {
                 if (resp.headers.get("Content-Type").startsWith("application/json")) {
@@ -295,7 +330,7 @@ window.onload = () => {
             kept.querySelector(".tag-name").dataset["used"] = info.used.toFixed(0);
             kept.querySelector(".tag-images").replaceChildren(...info.images.map(fn => {
                 const img = document.createElement('div');
-                img.style.backgroundImage = `url("${config.urls.loadImage}?fn=${encodeURIComponent(fn)}&tn=true")`;
+                img.style.backgroundImage = `url("${config.urls.loadImage}&fn=${encodeURIComponent(fn)}&tn=true")`;
                 return img;
             }));
         };
@@ -498,7 +533,7 @@ window.onload = () => {
 
     async function fetchTags() {
 
-        const resp = await fetch(`${config.urls.tags}?extended=true`);
+        const resp = await fetch(`${config.urls.tags}&extended=true`);
 
         if (!resp.ok) {
             if (resp.headers.get("Content-Type").startsWith("application/json")) {
@@ -0,0 +1,43 @@
+"""
+Fixtures shared by the tests: the application, configured with a file of its own, and a library
+of its own for every test.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def web(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("config")
+    config = folder / "config.json"
+    config.write_text(json.dumps({
+        "SECRET_KEY": "test",
+        "LIBRARIES": {},
+    }), encoding="utf-8")
+    os.environ["IMAGE_TAGGER_CONFIG"] = str(config)
+    sys.path.insert(0, ROOT)
+
+    import web as module # pylint: disable=import-outside-toplevel
+
+    return module
+
+
+@pytest.fixture
+def images_library(web, tmp_path):
+    """An empty library of its own, its images folder and database in a temporary folder."""
+
+    folder = tmp_path / "images"
+    folder.mkdir()
+    name = f"images-{tmp_path.name}"
+    web.app.config["LIBRARIES"][name] = {
+        "DATABASE": str(tmp_path / "tags.db3"),
+        "IMAGES_FOLDER": str(folder),
+    }
+    yield name, folder
+    del web.app.config["LIBRARIES"][name]
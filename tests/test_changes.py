@@ -0,0 +1,28 @@
+"""
+The change log: what the endpoints log, and what clients catching up with /changes receive.
+"""
+
+
+def test_only_real_tag_updates_are_logged(web, images_library):
+    name, _ = images_library
+    client = web.app.test_client()
+    response = client.post(f"/addTag?library={name}", data={"name": "sky", "description": "blue"})
+    assert response.status_code == 201
+    tag_id = client.get(f"/tags?library={name}").get_json()[0]["id"]
+    since = client.get(f"/changes?library={name}&since=0").get_json()["seq"]
+
+    def update(**form):
+        response = client.post(f"/updateTag?library={name}", data=form)
+        assert response.status_code == 200
+        return response.get_json()["status"]
+
+    def logged():
+        return [(change["type"], change["details"]["field"], change["details"]["newValue"])
+                for change in client.get(f"/changes?library={name}&since={since}").get_json()["changes"]]
+
+    assert update(tag_id=tag_id, name="sky", description="blue") == "no changes"
+    assert update(tag_id=tag_id + 1, name="unknown") == "no changes"
+    assert logged() == []
+
+    assert update(tag_id=tag_id, name="sky", description="clear") == "success"
+    assert logged() == [("tagUpdated", "description", "clear")]
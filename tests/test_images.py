@@ -0,0 +1,216 @@
+"""
+Serving the images: the output format negotiated with the client, and the image pool decoding
+them within its queue and decode budget.
+"""
+
+# pylint: disable=protected-access
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import functools
+from io import BytesIO
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def write_image(folder, fn, size=(64, 48), color=(200, 40, 40)):
+    Image.new("RGB", size, color).save(folder / fn)
+
+
+@pytest.fixture
+def pool(web, monkeypatch):
+    """
+    A fresh image pool and rendition cache, not shared with the other tests. The workers are
+    threads, so that the tests can hold them up.
+    """
+
+    image_pool = web._ImagePool(2, 2, web._DecodeBudget(64 * 1024 ** 2), 0)
+    image_pool._executor = ThreadPoolExecutor(max_workers=image_pool.workers)
+    monkeypatch.setattr(web, "_image_pool", image_pool)
+    monkeypatch.setattr(web, "_rendition_cache", web._RenditionCache(1024 ** 2))
+    yield image_pool
+    if image_pool._executor is not None:
+        image_pool._executor.shutdown()
+
+
+@pytest.mark.parametrize("accept, mimetype", [
+    ("image/webp,*/*", "image/webp"),
+    ("image/avif,image/webp,*/*", "image/avif"),
+    ("*/*", "image/jpeg"),
+])
+def test_output_format_is_negotiated(web, images_library, pool, accept, mimetype): # pylint: disable=unused-argument
+    name, folder = images_library
+    write_image(folder, "a.jpg")
+    client = web.app.test_client()
+
+    response = client.get(f"/loadImage?library={name}&fn=a.jpg", headers={"Accept": accept})
+
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert "Accept" in response.vary
+    with Image.open(BytesIO(response.data)) as img:
+        assert Image.MIME[img.format] == mimetype
+
+
+def test_prefetch_follows_the_client_listing(web, images_library, pool):
+    name, folder = images_library
+    for fn in ("a.jpg", "b.jpg", "c.jpg", "d.jpg"):
+        write_image(folder, fn)
+    client = web.app.test_client()
+
+    # Browsing a search listing d.jpg, b.jpg, a.jpg backwards from b.jpg; x.jpg is not an image
+    response = client.get(f"/loadImage?library={name}&fn=b.jpg&prefetch=a.jpg&prefetch=x.jpg"
+                          "&prefetch=d.jpg", headers={"Accept": "image/jpeg"})
+    assert response.status_code == 200
+
+    def prefetched():
+        return {fn for fn in ("a.jpg", "c.jpg", "d.jpg")
+                if web._rendition_key(str(folder / fn), False, "JPEG") in web._rendition_cache}
+
+    # The renditions are cached by the callbacks of the pool, once the workers are done
+    wait_for(lambda: pool.stats()["depth"] == 0 and len(prefetched()) >= 2)
+    assert prefetched() == {"a.jpg", "d.jpg"}
+
+
+def test_saturated_pool_answers_503(web, images_library, pool):
+    name, folder = images_library
+    write_image(folder, "a.jpg")
+    client = web.app.test_client()
+    release = threading.Event()
+
+    # Every worker busy and every queue slot taken
+    for i in range(pool.workers + pool.max_queue):
+        pool.submit(("busy", i), release.wait)
+    try:
+        response = client.get(f"/loadImage?library={name}&fn=a.jpg")
+    finally:
+        release.set()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert pool.stats()["rejected"] == 1
+
+    wait_for(lambda: pool.stats()["depth"] == 0)
+    assert client.get(f"/loadImage?library={name}&fn=a.jpg").status_code == 200
+
+
+def test_identical_requests_are_coalesced(web, images_library, pool, monkeypatch):
+    name, folder = images_library
+    write_image(folder, "a.jpg")
+    release = threading.Event()
+    rendered = []
+    render_image = web._render_image
+
+    def held_render_image(*args):
+        rendered.append(args)
+        release.wait()
+        return render_image(*args)
+
+    monkeypatch.setattr(web, "_render_image", held_render_image)
+
+    responses = []
+
+    def load():
+        responses.append(web.app.test_client().get(f"/loadImage?library={name}&fn=a.jpg",
+                                                   headers={"Accept": "image/jpeg"}))
+
+    threads = [threading.Thread(target=load) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    try:
+        wait_for(lambda: pool.stats()["coalesced"] == 2)
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    assert len(rendered) == 1
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert len({response.data for response in responses}) == 1
+    assert pool.stats()["submitted"] == 1
+
+
+def test_large_jpeg_is_decoded_at_a_reduced_size(web, tmp_path):
+    path = tmp_path / "large.jpg"
+    Image.new("RGB", (4000, 3000), (10, 200, 30)).save(path)
+    max_pixels = 1000 * 750
+
+    box, cost = web._decode_plan(str(path), False, max_pixels, 64 * 1024 ** 2)
+
+    # Decoded at 1/4 of the size, the smallest scale still covering max_pixels
+    assert box == (1000, 750)
+    assert cost == 1000 * 750 * 3
+
+    with Image.open(BytesIO(web._render_image(str(path), False, "JPEG", max_pixels, box))) as img:
+        assert img.size == (1000, 750)
+
+
+def test_image_over_the_decode_budget_answers_413(web, images_library, pool):
+    name, folder = images_library
+    # PNG images are decoded at full size: 100 × 100 × 3 bytes
+    write_image(folder, "a.png", size=(100, 100))
+    pool.budget.max_bytes = 100 * 100 * 3 - 1
+    client = web.app.test_client()
+
+    response = client.get(f"/loadImage?library={name}&fn=a.png")
+
+    assert response.status_code == 413
+    assert pool.budget.stats()["usedBytes"] == 0
+
+    pool.budget.max_bytes = 100 * 100 * 3
+    assert client.get(f"/loadImage?library={name}&fn=a.png").status_code == 200
+
+
+def test_budget_is_released_when_decoding_fails(web, images_library, pool, monkeypatch):
+    name, folder = images_library
+    write_image(folder, "a.png", size=(100, 100))
+    client = web.app.test_client()
+    render_image = web._render_image
+
+    def failing_render_image(*args):
+        raise OSError("truncated")
+
+    monkeypatch.setattr(web, "_render_image", failing_render_image)
+    response = client.get(f"/loadImage?library={name}&fn=a.png")
+    assert response.status_code == 500
+
+    # Released by the callback of the failed work, even if nobody waits for it
+    wait_for(lambda: pool.stats()["depth"] == 0)
+    budget = pool.budget.stats()
+    assert budget["usedBytes"] == 0
+    assert budget["admitted"] == 1
+    assert pool.stats()["failed"] == 1
+
+    # The whole budget is available again
+    monkeypatch.setattr(web, "_render_image", render_image)
+    pool.budget.max_bytes = 100 * 100 * 3
+    assert client.get(f"/loadImage?library={name}&fn=a.png").status_code == 200
+
+
+def test_shared_cache_logs_failed_writes_from_pool_callbacks(web, tmp_path, monkeypatch, caplog):
+    cache = web._SharedRenditionCache(str(tmp_path / "renditions"), 1024 ** 2)
+
+    def failing_write(path, data):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cache, "_write", failing_write)
+    future = Future()
+
+    # Called back on a thread of the pool, outside of any application context
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(future.add_done_callback,
+                        functools.partial(web._cache_rendition, cache, ("a.jpg",))).result()
+        executor.submit(future.set_result, b"rendition").result()
+
+    assert [(record.levelname, record.getMessage().split(" ")[:3]) for record in caplog.records] == \
+        [("WARNING", ["Could", "not", "store"])]
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,95 @@
+"""
+Indexing the image files: their metadata and placeholders, whatever codecs Pillow was built with,
+and the listings sorted by the index.
+"""
+
+# pylint: disable=protected-access
+
+import json
+import sqlite3
+
+import pytest
+from PIL import Image, features
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", (160, 90), (20, 120, 220)).save(path)
+    return str(path)
+
+
+def test_placeholder_is_webp(web, photo):
+    metadata = web._index_image_file(photo)
+
+    assert metadata["placeholder"].startswith("data:image/webp;base64,")
+    assert (metadata["width"], metadata["height"]) == (160, 90)
+
+
+def test_placeholder_falls_back_to_jpeg_without_webp(web, photo, monkeypatch):
+    monkeypatch.setattr(features, "check", lambda feature: feature != "webp")
+
+    metadata = web._index_image_file(photo)
+
+    assert metadata["placeholder"].startswith("data:image/jpeg;base64,")
+
+
+def test_metadata_is_kept_when_the_placeholder_fails(web, photo, monkeypatch):
+    def save(*args, **kwargs):
+        raise KeyError("WEBP")
+
+    monkeypatch.setattr(Image.Image, "save", save)
+
+    metadata = web._index_image_file(photo)
+
+    assert metadata["placeholder"] is None
+    assert (metadata["width"], metadata["height"]) == (160, 90)
+
+
+def test_index_images_skips_the_files_it_can_not_decode(web, images_library):
+    name, folder = images_library
+    Image.new("RGB", (32, 24)).save(folder / "a.jpg")
+    (folder / "broken.jpg").write_bytes(b"\xff\xd8\xff" + b"\x00" * 64)
+
+    # As the flask command does, the commands run in an application context
+    with web.app.app_context():
+        result = web.app.test_cli_runner().invoke(args=["index-images", "--library", name])
+
+    assert result.exit_code == 0, result.output
+    with sqlite3.connect(web.app.config["LIBRARIES"][name]["DATABASE"]) as db:
+        indexed = dict(db.execute("SELECT fn, placeholder IS NOT NULL FROM image_files;"))
+    assert indexed == { "a.jpg": 1, "broken.jpg": 0 }
+
+
+def test_sorted_listings_keep_the_images_not_indexed_yet(web, images_library):
+    name, folder = images_library
+    for fn, size in (("a.jpg", (64, 48)), ("b.jpg", (128, 96)), ("c.jpg", (32, 24))):
+        Image.new("RGB", size).save(folder / fn)
+    client = web.app.test_client()
+
+    with web.app.app_context():
+        result = web.app.test_cli_runner().invoke(args=["index-images", "--library", name])
+    assert result.exit_code == 0, result.output
+    Image.new("RGB", (256, 192)).save(folder / "added.jpg")
+
+    response = client.get(f"/images?library={name}&sort=-pixels")
+    assert response.get_json() == ["b.jpg", "a.jpg", "c.jpg", "added.jpg"]
+    # Without metadata, the images not indexed yet match no filter
+    response = client.get(f"/images?library={name}&sort=-pixels&minWidth=64")
+    assert response.get_json() == ["b.jpg", "a.jpg"]
+
+    response = client.post(f"/addTag?library={name}", data={"name": "tag", "description": ""})
+    assert response.status_code == 201
+    tag_id = client.get(f"/tags?library={name}").get_json()[0]["id"]
+    for fn in ("added.jpg", "a.jpg", "b.jpg"):
+        client.post(f"/toggleTags?library={name}", data={"fn": fn, "tags": json.dumps([tag_id])})
+
+    response = client.post(f"/searchImages?library={name}&sort=pixels",
+                           data={"tags": json.dumps([tag_id])})
+    assert response.get_json() == ["a.jpg", "b.jpg", "added.jpg"]
+    response = client.post(f"/searchImages?library={name}&libraries={name}&sort=pixels",
+                           data={"tags": json.dumps([tag_id])})
+    assert [image["fn"] for image in response.get_json()] == ["a.jpg", "b.jpg", "added.jpg"]
+    response = client.post(f"/searchImages?library={name}&libraries={name}&minWidth=64",
+                           data={"tags": json.dumps([tag_id])})
+    assert [image["fn"] for image in response.get_json()] == ["a.jpg", "b.jpg"]
@@ -0,0 +1,230 @@
+"""
+Schema migrations and the data the triggers keep up to date: whatever the database was created
+with, the counters, the tag pairs and the results of the saved searches must match a full
+recomputation after tagging images, merging tags and deleting tags.
+"""
+
+import json
+import os
+import random
+import re
+import sqlite3
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Schema of the databases created before the migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE images (
+    image_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fn TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE tagged_images (
+    image_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (image_id, tag_id)
+);
+
+CREATE TABLE tags (
+    tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT,
+    used INTEGER,
+    lang TEXT NOT NULL
+);
+
+CREATE TABLE tags_en (
+    tag_id INTEGER PRIMARY KEY NOT NULL,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE tags_fr (
+    tag_id INTEGER PRIMARY KEY NOT NULL,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT
+);
+"""
+
+IMAGES = [f"img{i:02d}.jpg" for i in range(12)]
+
+
+@pytest.fixture(params=["empty", "baseline"])
+def library(request, web, tmp_path):
+    """A library of its own for every test, its database created empty or with the old schema."""
+
+    database = str(tmp_path / "tags.db3")
+    if request.param == "baseline":
+        db = sqlite3.connect(database)
+        db.executescript(BASELINE_SCHEMA)
+        db.executemany("INSERT INTO tags (name, description, used, lang) VALUES (?, '', 0, 'en');",
+                       [("old0",), ("old1",), ("old2",)])
+        db.executemany("INSERT INTO tags_fr (tag_id, name, description) VALUES (?, ?, '');",
+                       [(1, "ancien0"), (2, "ancien1")])
+        db.executemany("INSERT INTO images (fn) VALUES (?);", [(fn,) for fn in IMAGES[:4]])
+        # The used counters were maintained by the endpoints, and not always right
+        db.executemany("INSERT INTO tagged_images (image_id, tag_id) VALUES (?, ?);",
+                       [(1, 1), (1, 2), (2, 1), (3, 3), (4, 2)])
+        db.commit()
+        db.close()
+
+    name = f"{request.param}-{tmp_path.name}"
+    web.app.config["LIBRARIES"][name] = {
+        "DATABASE": database,
+        "IMAGES_FOLDER": str(tmp_path),
+    }
+    yield name, database
+    del web.app.config["LIBRARIES"][name]
+
+
+def latest_version():
+    return max(int(re.match(r"^(\d+)-", fn).group(1))
+               for fn in os.listdir(os.path.join(ROOT, "resources", "migrations"))
+               if fn.endswith(".sql"))
+
+
+def generations(database):
+    with sqlite3.connect(database) as db:
+        return dict(db.execute("SELECT namespace, generation FROM cache_generations;"))
+
+
+def assert_consistent(database):
+    db = sqlite3.connect(database)
+    try:
+        assert db.execute(
+            "SELECT tag_id FROM tags WHERE used != ("
+            "SELECT COUNT(*) FROM tagged_images AS ti WHERE ti.tag_id = tags.tag_id);"
+        ).fetchall() == []
+
+        assert set(db.execute("SELECT tag_id, other_id, count FROM tag_pairs WHERE count != 0;")) == set(
+            db.execute("SELECT a.tag_id, b.tag_id, COUNT(*) FROM tagged_images AS a "
+                       "JOIN tagged_images AS b ON b.image_id = a.image_id AND b.tag_id != a.tag_id "
+                       "GROUP BY a.tag_id, b.tag_id;"))
+        assert db.execute("SELECT value FROM counters WHERE name = 'taggedImages';").fetchone() == \
+            db.execute("SELECT COUNT(DISTINCT image_id) FROM tagged_images;").fetchone()
+
+        assert db.execute(
+            "SELECT f.fn FROM image_files AS f WHERE f.tag_count != ("
+            "SELECT COUNT(*) FROM tagged_images AS ti JOIN images AS i ON i.image_id = ti.image_id "
+            "WHERE i.fn = f.fn);"
+        ).fetchall() == []
+        assert set(db.execute("SELECT format, tag_count, files FROM file_tag_counts "
+                              "WHERE files != 0;")) == \
+            set(db.execute("SELECT COALESCE(format, '?'), tag_count, COUNT(*) FROM image_files "
+                           "GROUP BY COALESCE(format, '?'), tag_count;"))
+
+        image_tags = {}
+        for image_id, tag_id in db.execute("SELECT image_id, tag_id FROM tagged_images;"):
+            image_tags.setdefault(image_id, set()).add(tag_id)
+        for search_id, required, size in db.execute(
+                "SELECT search_id, required, size FROM saved_searches;").fetchall():
+            conditions = db.execute("SELECT tag_id, excluded FROM saved_search_tags "
+                                    "WHERE search_id = ?;", (search_id,)).fetchall()
+            tags = {tag_id for tag_id, excluded in conditions if not excluded}
+            excluded = {tag_id for tag_id, excluded in conditions if excluded}
+            expected = {image_id for image_id, found in image_tags.items()
+                        if tags and tags <= found and not excluded & found}
+            found = {image_id for image_id, in db.execute(
+                "SELECT image_id FROM saved_search_images WHERE search_id = ?;", (search_id,))}
+            assert required == len(tags)
+            assert found == expected
+            assert size == len(expected)
+    finally:
+        db.close()
+
+
+def test_migrations_reach_the_latest_version(web, library):
+    name, database = library
+    client = web.app.test_client()
+
+    assert client.get(f"/tags?library={name}").status_code == 200
+
+    with sqlite3.connect(database) as db:
+        assert db.execute("PRAGMA user_version;").fetchone()[0] == latest_version()
+        tables = {table for table, in db.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+    with open(os.path.join(ROOT, "resources", "schema.sql"), encoding="utf-8") as f:
+        dropped = set(re.findall(r"DROP TABLE IF EXISTS (\w+);", f.read()))
+    # The translation tables of the old schema are merged into tag_translations
+    assert dropped - {"tags_en", "tags_fr"} <= tables
+
+    assert_consistent(database)
+
+
+def test_baseline_data_is_kept(web, library):
+    name, database = library
+    if not name.startswith("baseline"):
+        pytest.skip("only databases of the old schema have data")
+    client = web.app.test_client()
+
+    tags = {tag["id"]: tag for tag in client.get(f"/tags?library={name}").get_json()}
+    assert {tag_id: tag["used"] for tag_id, tag in tags.items()} == { 1: 2, 2: 2, 3: 1 }
+
+    tags = {tag["id"]: tag for tag in client.get(f"/tags?library={name}",
+                                                  headers={"Accept-Language": "fr"}).get_json()}
+    assert tags[1]["name"] == "ancien0"
+
+    assert_consistent(database)
+
+
+def test_triggers_match_a_recomputation(web, library):
+    name, database = library
+    client = web.app.test_client()
+    rng = random.Random(42)
+
+    for i in range(6):
+        response = client.post(f"/addTag?library={name}", data={"name": f"tag{i}", "description": ""})
+        assert response.status_code == 201
+    tag_ids = [tag["id"] for tag in client.get(f"/tags?library={name}").get_json()]
+
+    # Indexed files, as index-images would record them, some not recognized (yet)
+    with sqlite3.connect(database) as db:
+        db.executemany("INSERT INTO image_files (fn, mtime_ns, size, format) VALUES (?, 0, 0, ?);",
+                       [(fn, (None, "JPEG", "")[i % 3]) for i, fn in enumerate(IMAGES)])
+
+    for i in range(4):
+        tags, excluded = rng.sample(tag_ids, 2), rng.sample(tag_ids, 1)
+        response = client.post(f"/addSavedSearch?library={name}", data={
+            "name": f"search{i}",
+            "tags": json.dumps([tags[0]] if i % 2 else tags),
+            "excluded": json.dumps([] if excluded[0] in tags else excluded),
+        })
+        assert response.status_code == 201
+    assert_consistent(database)
+
+    # Toggle
+    for _ in range(40):
+        before = generations(database)
+        response = client.post(f"/toggleTags?library={name}", data={
+            "fn": rng.choice(IMAGES),
+            "tags": json.dumps(rng.sample(tag_ids, rng.randint(1, 3))),
+        })
+        assert response.status_code == 200
+        after = generations(database)
+        assert after["taggedImages"] > before["taggedImages"]
+        assert after["tagUsage"] > before["tagUsage"]
+        # The listings of the image files do not depend on their tags
+        assert after["imageFiles"] == before["imageFiles"]
+        assert after["tags"] == before["tags"]
+    assert_consistent(database)
+
+    # Index again, recognizing other formats
+    with sqlite3.connect(database) as db:
+        db.executemany("UPDATE image_files SET format = ? WHERE fn = ?;",
+                       [("PNG", IMAGES[0]), (None, IMAGES[1]), ("JPEG", IMAGES[2])])
+    assert_consistent(database)
+
+    # Merge
+    keep_id, *merged_ids = rng.sample(tag_ids, 3)
+    response = client.post(f"/deDuplicate?library={name}",
+                           data={"tags": json.dumps([keep_id, *merged_ids])})
+    assert response.status_code == 200
+    assert_consistent(database)
+    tag_ids = [tag_id for tag_id in tag_ids if tag_id not in merged_ids]
+
+    # Delete
+    response = client.post(f"/deleteTags?library={name}",
+                           data={"tags": json.dumps(rng.sample(tag_ids, 2))})
+    assert response.status_code == 200
+    assert_consistent(database)
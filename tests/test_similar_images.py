@@ -0,0 +1,84 @@
+"""
+The visual similarity search: the ranking of the feature vectors, and the float16 feature matrix
+a running process keeps mapped while index-images updates it.
+"""
+
+import pytest
+from PIL import Image, ImageDraw
+
+pytest.importorskip("numpy")
+
+
+def write_image(folder, fn, color, stripes=None):
+    img = Image.new("RGB", (160, 120), color)
+    if stripes is not None:
+        draw = ImageDraw.Draw(img)
+        for x in range(0, 160, 20):
+            draw.rectangle((x, 0, x + 9, 119), fill=stripes)
+    img.save(folder / fn)
+
+
+def index_images(web, name):
+    with web.app.app_context():
+        result = web.app.test_cli_runner().invoke(args=["index-images", "--library", name])
+    assert result.exit_code == 0, result.output
+
+
+def similar(client, name, fn):
+    response = client.get(f"/similarImages?library={name}&fn={fn}&limit=10")
+    assert response.status_code == 200
+    return [image["fn"] for image in response.get_json()]
+
+
+def test_similar_images_are_ranked_first(web, images_library):
+    name, folder = images_library
+    write_image(folder, "red.jpg", (220, 30, 30))
+    write_image(folder, "dark-red.jpg", (190, 20, 20))
+    write_image(folder, "red-stripes.jpg", (220, 30, 30), stripes=(30, 30, 220))
+    write_image(folder, "blue.jpg", (30, 30, 220))
+    index_images(web, name)
+    client = web.app.test_client()
+
+    # The image itself is not listed, and the scores go down
+    assert similar(client, name, "red.jpg") == ["dark-red.jpg", "red-stripes.jpg", "blue.jpg"]
+    scores = [image["score"] for image in
+              client.get(f"/similarImages?library={name}&fn=red.jpg").get_json()]
+    assert scores == sorted(scores, reverse=True)
+    assert 0 < scores[-1] < scores[0] <= 1
+
+    # The stripes are blue
+    assert similar(client, name, "blue.jpg")[0] == "red-stripes.jpg"
+
+
+def test_reindexing_is_seen_by_a_running_process(web, images_library):
+    name, folder = images_library
+    write_image(folder, "red.jpg", (220, 30, 30))
+    write_image(folder, "blue.jpg", (30, 30, 220))
+    index_images(web, name)
+    client = web.app.test_client()
+
+    # Maps the feature matrix
+    assert similar(client, name, "red.jpg") == ["blue.jpg"]
+
+    write_image(folder, "dark-red.jpg", (190, 20, 20))
+    index_images(web, name)
+
+    assert similar(client, name, "red.jpg") == ["dark-red.jpg", "blue.jpg"]
+    assert similar(client, name, "dark-red.jpg")[0] == "red.jpg"
+
+
+def test_images_without_features(web, images_library):
+    name, folder = images_library
+    write_image(folder, "red.jpg", (220, 30, 30))
+    write_image(folder, "dark-red.jpg", (190, 20, 20))
+    # Recognized as a JPEG image, but it can not be decoded
+    (folder / "broken.jpg").write_bytes(b"\xff\xd8\xff" + b"\x00" * 64)
+    index_images(web, name)
+    client = web.app.test_client()
+
+    assert similar(client, name, "broken.jpg") == []
+    assert similar(client, name, "red.jpg") == ["dark-red.jpg"]
+
+    # Not indexed yet
+    write_image(folder, "blue.jpg", (30, 30, 220))
+    assert client.get(f"/similarImages?library={name}&fn=blue.jpg").status_code == 404
@@ -0,0 +1,75 @@
+"""
+Tag suggestions from the co-occurrence index: their pointwise mutual information, checked against
+a small table computed by hand.
+"""
+
+import json
+import math
+import sqlite3
+
+import pytest
+
+# Tags of every image: 5 tagged images, A is used 3 times, B, C and D twice
+IMAGE_TAGS = {
+    "img1.jpg": ["A", "B"],
+    "img2.jpg": ["A", "B"],
+    "img3.jpg": ["A", "C"],
+    "img4.jpg": ["C", "D"],
+    "img5.jpg": ["D"],
+}
+
+
+def score(count, used, other_used, tagged=5):
+    """The PMI of a pair, with its discount for the pairs and tags seen only a few times."""
+
+    rarest = min(used, other_used)
+    return math.log(count * tagged / (used * other_used)) * count / (count + 1) * rarest / (rarest + 1)
+
+
+@pytest.fixture
+def tagged(web, images_library):
+    name, _ = images_library
+    client = web.app.test_client()
+    for tag in ("A", "B", "C", "D"):
+        response = client.post(f"/addTag?library={name}", data={"name": tag, "description": ""})
+        assert response.status_code == 201
+    ids = {tag["name"]: tag["id"] for tag in client.get(f"/tags?library={name}").get_json()}
+    for fn, tags in IMAGE_TAGS.items():
+        response = client.post(f"/toggleTags?library={name}",
+                               data={"fn": fn, "tags": json.dumps([ids[tag] for tag in tags])})
+        assert response.status_code == 200
+
+    def suggest(*tags):
+        tag_ids = ",".join(str(ids[tag]) for tag in tags)
+        response = client.get(f"/suggestTags?library={name}&tags={tag_ids}")
+        assert response.status_code == 200
+        names = { tag_id: tag for tag, tag_id in ids.items() }
+        return [(names[suggestion["id"]], suggestion["score"]) for suggestion in response.get_json()]
+
+    return name, ids, suggest
+
+
+def test_suggestions_follow_the_pmi(tagged):
+    _, _, suggest = tagged
+
+    # A and C were seen together less often than by chance: ln(1 × 5 / (3 × 2)) < 0
+    assert suggest("A") == [("B", pytest.approx(score(2, 3, 2), abs=1e-4))]
+    assert suggest("C") == [("D", pytest.approx(score(1, 2, 2), abs=1e-4))]
+    # The scores of every given tag add up, the given tags are not suggested
+    assert suggest("A", "C") == [("B", pytest.approx(score(2, 3, 2), abs=1e-4)),
+                                 ("D", pytest.approx(score(1, 2, 2), abs=1e-4))]
+    assert suggest("B", "D") == [("A", pytest.approx(score(2, 2, 3), abs=1e-4)),
+                                 ("C", pytest.approx(score(1, 2, 2), abs=1e-4))]
+    assert suggest("A", "B") == []
+
+
+def test_tags_without_images_are_not_suggested(web, tagged):
+    name, ids, suggest = tagged
+
+    # As if the images of D were untagged between the reads of the pairs and of the usage counts
+    with sqlite3.connect(web.app.config["LIBRARIES"][name]["DATABASE"]) as db:
+        db.execute("UPDATE tags SET used = 0 WHERE tag_id = ?;", (ids["D"],))
+
+    assert suggest("C") == []
+    assert suggest("D") == []
+    assert suggest("A") == [("B", pytest.approx(score(2, 3, 2), abs=1e-4))]
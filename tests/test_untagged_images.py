@@ -0,0 +1,74 @@
+"""
+The "next untagged image" work queue: the images it lists and the progress of the tagging, which
+only counts the images the listings show.
+"""
+
+import json
+import sqlite3
+
+from PIL import Image
+
+
+def test_progress_counts_the_listed_images(web, images_library):
+    name, folder = images_library
+    for fn in ("a.jpg", "b.jpg", "c.jpg"):
+        Image.new("RGB", (32, 24)).save(folder / fn)
+    (folder / "fake.jpg").write_bytes(b"not an image")
+    client = web.app.test_client()
+
+    def untagged():
+        response = client.get(f"/untaggedImages?library={name}")
+        assert response.status_code == 200
+        return response.get_json()
+
+    # Nothing is indexed yet
+    assert untagged() == { "images": [], "progress": { "files": 0, "done": 0, "remaining": 0 } }
+
+    # As index-images records them: fake.jpg is in none of the formats
+    with sqlite3.connect(web.app.config["LIBRARIES"][name]["DATABASE"]) as db:
+        db.executemany("INSERT INTO image_files (fn, mtime_ns, size, format) VALUES (?, 0, 0, ?);",
+                       [("a.jpg", "JPEG"), ("b.jpg", "JPEG"), ("c.jpg", "JPEG"), ("fake.jpg", "")])
+    (folder / "c.jpg").unlink()
+
+    found = untagged()
+    assert found["images"] == ["a.jpg", "b.jpg"]
+    assert found["progress"] == { "files": 2, "done": 0, "remaining": 2 }
+
+    response = client.post(f"/addTag?library={name}", data={"name": "tag", "description": ""})
+    assert response.status_code == 201
+    tag_id = client.get(f"/tags?library={name}").get_json()[0]["id"]
+    for fn in ("a.jpg", "b.jpg"):
+        response = client.post(f"/toggleTags?library={name}",
+                               data={"fn": fn, "tags": json.dumps([tag_id])})
+        assert response.status_code == 200
+
+    found = untagged()
+    assert found["images"] == []
+    assert found["progress"] == { "files": 2, "done": 2, "remaining": 0 }
+
+
+def test_deleted_files_do_not_end_the_queue(web, images_library):
+    name, folder = images_library
+    for fn in ("a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg"):
+        Image.new("RGB", (32, 24)).save(folder / fn)
+    client = web.app.test_client()
+    assert client.get(f"/untaggedImages?library={name}").status_code == 200
+
+    with sqlite3.connect(web.app.config["LIBRARIES"][name]["DATABASE"]) as db:
+        db.executemany("INSERT INTO image_files (fn, mtime_ns, size, format) VALUES (?, 0, 0, ?);",
+                       [(fn, "JPEG") for fn in ("a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg")])
+    for fn in ("a.jpg", "b.jpg", "c.jpg"):
+        (folder / fn).unlink()
+
+    # The first pages of the index only hold deleted files
+    response = client.get(f"/untaggedImages?library={name}&limit=1")
+    assert response.get_json()["images"] == ["d.jpg"]
+    response = client.get(f"/untaggedImages?library={name}&limit=2&after=d.jpg")
+    assert response.get_json()["images"] == ["e.jpg"]
+
+    # Only the progress
+    response = client.get(f"/untaggedImages?library={name}&limit=0")
+    assert response.get_json() == {
+        "images": [],
+        "progress": { "files": 2, "done": 0, "remaining": 2 },
+    }
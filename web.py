@@ -2,21 +2,36 @@
 Image Tagger flask application.
 """
 
-from collections import defaultdict
+import base64
+from collections import OrderedDict, defaultdict, deque
+import contextlib
 import functools
-from http.client import HTTPConnection
+import gzip
+import hashlib
 from io import BytesIO
 import json
+import math
+import mimetypes
+import mmap
 import os
 import random
 import re
 import sqlite3
+import sys
 import textwrap
+import threading
+import time
 from typing import Any, Mapping
 
-from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
 import click
-from flask import Flask, abort, current_app, g, jsonify, render_template, request, send_file
+from flask import (Flask, abort, current_app, g, jsonify, render_template, request, send_file,
+                   send_from_directory, url_for)
+from jinja2 import FileSystemBytecodeCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 VERSION = "1.0.12"
 SUPPORTED_LANGS = {
@@ -24,28 +39,568 @@ SUPPORTED_LANGS = {
     "fr": "French",
 }
 DEFAULT_LANG = "en"
+# Image formats that can be listed and decoded: file extensions and header signature
+INPUT_FORMATS = {
+    "BMP": ((".bmp",), re.compile(rb"BM")),
+    "JPEG": ((".jpg", ".jpeg", ".jpe", ".jfif"), re.compile(rb"\xff\xd8\xff")),
+    "PNG": ((".png",), re.compile(rb"\x89PNG\r\n\x1a\n")),
+    "GIF": ((".gif",), re.compile(rb"GIF8[79]a")),
+    "WEBP": ((".webp",), re.compile(rb"RIFF.{4}WEBP", re.DOTALL)),
+    "TIFF": ((".tif", ".tiff"), re.compile(rb"II\*\x00|MM\x00\*")),
+    "AVIF": ((".avif",), re.compile(rb".{4}ftypavi[fs]", re.DOTALL)),
+}
+# Image formats that can be served: mimetype, Pillow save options and Pillow feature of the encoder
+OUTPUT_FORMATS = {
+    "AVIF": ("image/avif", { "quality": 60, "speed": 8 }, "avif"),
+    "WEBP": ("image/webp", { "quality": 80 }, "webp"),
+    "JPEG": ("image/jpeg", { "quality": 85, "optimize": True }, "jpg"),
+}
+# Sort keys and range filters of the image listings, evaluated on the image_files index
+IMAGE_SORT_KEYS = {
+    "name": "f.fn",
+    "taken": "f.taken",
+    "width": "f.width",
+    "height": "f.height",
+    "pixels": "f.width * f.height",
+    "size": "f.size",
+    "modified": "f.mtime_ns",
+}
+IMAGE_FILTERS = {
+    "minWidth": ("f.width >= ?", int),
+    "maxWidth": ("f.width <= ?", int),
+    "minHeight": ("f.height >= ?", int),
+    "maxHeight": ("f.height <= ?", int),
+    "minSize": ("f.size >= ?", int),
+    "maxSize": ("f.size <= ?", int),
+    "takenFrom": ("f.taken >= ?", str),
+    # Dates are stored as "YYYY-MM-DD HH:MM:SS", so takenTo=2023 includes the whole year
+    "takenTo": ("f.taken <= ?", lambda value: f"{value}~"),
+    "camera": ("f.camera = ?", str),
+}
+IMAGE_ORIENTATIONS = {
+    "landscape": "f.width > f.height",
+    "portrait": "f.width < f.height",
+    "square": "f.width = f.height",
+}
+# Length of the image feature vectors: a 4x4x4 color histogram, a 16 bin edge strength histogram,
+# the 4x4 edge layout and an 8x8 grayscale thumbnail. Bump the version when the features change.
+FEATURE_SIZE = 64 + 16 + 16 + 64
+FEATURE_VERSION = 1
+
+class _TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    Bytecode cache of the compiled templates, creating its folder when the first template is
+    stored. When the folder can not be written to (e.g. a read-only installation), the templates
+    are compiled by every process, as without a cache.
+    """
+
+    def dump_bytecode(self, bucket):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
 
 app = Flask("Image Tagger")
 
-app.config.from_file("config.json", load=json.load)
+# Another configuration file can be used, e.g. by the tests
+app.config.from_file(os.environ.get("IMAGE_TAGGER_CONFIG", "config.json"), load=json.load)
+
+# Compiled templates are kept between runs, new processes load them instead of parsing the templates
+_template_cache_folder = app.config.get("TEMPLATE_CACHE_FOLDER",
+                                        os.path.join(app.root_path, "build", "templates"))
+app.jinja_options = { **app.jinja_options,
+                      "bytecode_cache": _TemplateBytecodeCache(_template_cache_folder) }
+
+
+def _libraries():
+    """Returns the configured libraries, by name (a single one for the legacy configuration)."""
+
+    libraries = current_app.config.get("LIBRARIES", None)
+    if libraries is None:
+        return {
+            "default": {
+                "IMAGES_FOLDER": current_app.config["IMAGES_FOLDER"],
+                "DATABASE": current_app.config["DATABASE"],
+            },
+        }
+
+    return libraries
+
+
+def _default_library():
+    return current_app.config.get("DEFAULT_LIBRARY", next(iter(_libraries())))
+
+
+def _current_library():
+    return g.get('library', None) or _default_library()
+
+
+def _images_folder():
+    return _libraries()[_current_library()]["IMAGES_FOLDER"]
+
+
+# Open connections of each library's database (shard), reused across requests
+_shards = {}
+_shards_lock = threading.Lock()
+
+
+def _evict_idle_shards():
+    """Closes the connections and drops the caches of the libraries that were not used lately."""
+
+    idle_timeout = current_app.config.get("LIBRARY_IDLE_TIMEOUT", 300)
+    now = time.monotonic()
+
+    with _shards_lock:
+        idle = [name for name, shard in _shards.items()
+                if not shard["busy"] and now - shard["lastUsed"] > idle_timeout]
+        evicted = [(name, _shards.pop(name)) for name in idle]
+
+    for name, shard in evicted:
+        for db in shard["connections"]:
+            db.close()
+        folder = shard["folder"]
+        _image_listings.pop(folder, None)
+        with _tag_names_lock:
+            for key in [key for key in _tag_names if key[0] == name]:
+                del _tag_names[key]
+        with _feature_matrices_lock:
+            _feature_matrices.pop(name, None)
+        with _generation_watchers_lock:
+            watcher = _generation_watchers.pop(name, None)
+        if watcher is not None:
+            watcher["db"].close()
+        if _query_cache is not None:
+            _query_cache.evict(name)
+        if _rendition_cache is not None:
+            _rendition_cache.evict(lambda key, folder=folder: key[0].startswith(folder + os.sep))
+        current_app.logger.info("Evicted idle library \"%s\".", name)
+
+
+def _shards_stats():
+    with _shards_lock:
+        return {
+            name: {
+                "connections": len(shard["connections"]),
+                "busy": shard["busy"],
+                "idleSeconds": round(time.monotonic() - shard["lastUsed"], 1),
+            } for name, shard in _shards.items()
+        }
+
+
+def _acquire_db(library):
+    _evict_idle_shards()
+
+    with _shards_lock:
+        shard = _shards.setdefault(library, {
+            "connections": [],
+            "busy": 0,
+            "lastUsed": time.monotonic(),
+            "folder": _libraries()[library]["IMAGES_FOLDER"],
+        })
+        shard["busy"] += 1
+        if shard["connections"]:
+            return shard["connections"].pop()
+
+    db = None
+    try:
+        db = sqlite3.connect(_libraries()[library]["DATABASE"],
+                             detect_types=sqlite3.PARSE_DECLTYPES,
+                             check_same_thread=False)
+
+        if not shard.get("migrated", False):
+            db.execute(f"PRAGMA journal_mode = {current_app.config.get('DATABASE_JOURNAL_MODE', 'WAL')};")
+            for migration in _migrate(db):
+                current_app.logger.info("Applied migration %s to library \"%s\".", migration, library)
+            shard["migrated"] = True
+    except BaseException:
+        # Do not pin the shard: it has to be evicted when idle, even if it never opened
+        if db is not None:
+            db.close()
+        with _shards_lock:
+            shard["busy"] -= 1
+        raise
+
+    return db
 
 
 def _release_db(*args, **kwargs): # pylint: disable=unused-argument
-    db = g.get('db', None)
+    db = g.pop('db', None)
+
+    if db is None:
+        return
+
+    _return_db(g.pop('db_library'), db)
+
+
+def _return_db(library, db):
+    # Never hand over a connection in the middle of a transaction
+    db.rollback()
+
+    with _shards_lock:
+        shard = _shards.get(library)
+        if shard is not None:
+            shard["busy"] -= 1
+            shard["lastUsed"] = time.monotonic()
+            if len(shard["connections"]) < current_app.config.get("LIBRARY_POOL_SIZE", 4):
+                shard["connections"].append(db)
+                return
+
+    db.close()
+
+
+def _prepare_shard(library):
+    """
+    Makes sure the database of `library` is migrated before it is attached to the connection of
+    another library. Returns False when the database does not exist, attaching would create it.
+    """
+
+    if not os.path.isfile(_libraries()[library]["DATABASE"]):
+        return False
+
+    with _shards_lock:
+        shard = _shards.get(library)
+        if shard is not None and shard.get("migrated", False):
+            return True
 
-    if db is not None:
-        db.close()
+    _return_db(library, _acquire_db(library))
+
+    return True
 
 
 def _get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(current_app.config['DATABASE'],
-                               detect_types=sqlite3.PARSE_DECLTYPES)
+        g.db_library = _current_library()
+        g.db = _acquire_db(g.db_library)
 
     return g.db
 
 
+def _library_option(all_by_default=False):
+    """Adds the --library option to a CLI command, selecting the library it works on."""
+
+    def decorator(func):
+        @click.option('--library', default=None,
+                      help=("Name of the library (defaults to all the libraries)." if all_by_default
+                            else "Name of the library (defaults to the default library)."))
+        @functools.wraps(func)
+        def wrapper(*args, library=None, **kwargs):
+            if library is not None and library not in _libraries():
+                raise click.BadParameter(f"Unknown library \"{library}\".", param_hint="--library")
+            g.library = library
+
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@functools.cache
+def _migrations():
+    """Returns the version, name and script of the schema migrations, in order."""
+
+    folder = os.path.join(current_app.root_path, 'resources', 'migrations')
+    migrations = []
+    for fn in sorted(os.listdir(folder)):
+        match = re.match(r"^(\d+)-(.+)\.sql$", fn)
+        if match is None:
+            continue
+        with open(os.path.join(folder, fn), encoding="utf-8") as f:
+            migrations.append((int(match.group(1)), match.group(2), f.read()))
+
+    return migrations
+
+
+def _sql_statements(script):
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+
+
+def _migrate(db):
+    """
+    Applies the migrations newer than the `user_version` of the database, each one in its own
+    transaction. Returns the names of the applied migrations.
+    """
+
+    applied = []
+    for version, name, script in _migrations():
+        if db.execute("PRAGMA user_version;").fetchone()[0] >= version:
+            continue
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we were waiting for the lock
+            if db.execute("PRAGMA user_version;").fetchone()[0] >= version:
+                db.rollback()
+                continue
+            for statement in _sql_statements(script):
+                db.execute(statement)
+            db.execute(f"PRAGMA user_version = {version};")
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+
+        applied.append(f"{version:04d}-{name}")
+
+    return applied
+
+
+def _log_change(c, kind, details, key=None):
+    """
+    Appends a change to the log, in the transaction of the change itself. Changes with the same
+    `key` overwrite each other's value, so only the latest of them is kept by the compaction.
+    """
+
+    c.execute("INSERT INTO changes (kind, key, details, created) VALUES (?, ?, ?, ?);",
+              (kind, key, json.dumps(details), time.time()))
+
+    if c.lastrowid % current_app.config.get("CHANGE_LOG_COMPACT_EVERY", 256) == 0:
+        _compact_changes(c)
+
+
+def _compact_changes(c):
+    """
+    Removes the changes superseded by a later change with the same key and the changes older
+    than `CHANGE_LOG_RETENTION` seconds. Returns the number of removed changes.
+    """
+
+    retention = current_app.config.get("CHANGE_LOG_RETENTION", 7 * 24 * 3600)
+
+    c.execute("DELETE FROM changes "
+              "WHERE key IS NOT NULL AND seq < (SELECT MAX(newer.seq) FROM changes AS newer "
+              "                                 WHERE newer.key = changes.key);")
+    removed = c.rowcount
+
+    c.execute("SELECT MAX(seq) FROM changes WHERE created < ?;",
+              (time.time() - retention,))
+    pruned, *_ = c.fetchone()
+    if pruned is not None:
+        c.execute("DELETE FROM changes WHERE seq <= ?;", (pruned,))
+        removed += c.rowcount
+        c.execute("UPDATE changes_pruned SET seq = MAX(seq, ?);", (pruned,))
+
+    return removed
+
+
+def _read_changes(c, since, limit):
+    """
+    Returns the changes logged after the `since` sequence number, or None when some of them were
+    already pruned from the log (the client has to reload everything).
+    """
+
+    c.execute("SELECT seq FROM changes_pruned;")
+    pruned, *_ = c.fetchone()
+    if since < pruned:
+        return None
+
+    c.execute("SELECT seq, kind, details FROM changes WHERE seq > ? ORDER BY seq LIMIT ?;",
+              (since, limit))
+
+    return c.fetchall()
+
+
+def _last_change(c):
+    c.execute("SELECT MAX(seq) FROM changes;")
+    seq, *_ = c.fetchone()
+    if seq is None:
+        c.execute("SELECT seq FROM changes_pruned;")
+        seq, *_ = c.fetchone()
+
+    return seq
+
+
+def _log_used_changes(c, tag_ids):
+    """Logs the usage count of the tags, after it was changed by the triggers."""
+
+    c.execute(f"SELECT tag_id, used FROM tags WHERE tag_id IN ({', '.join('?' * len(tag_ids))});",
+              tag_ids)
+    for tag_id, used in c.fetchall():
+        _log_change(c, "tagUpdated",
+                    { "tagId": tag_id, "field": "used", "newValue": used, "lang": None },
+                    key=f"tag:{tag_id}:used")
+
+
+# Resolved names and descriptions of the tags per library and language, with the sequence number
+# of the last change they reflect
+_tag_names = {}
+_tag_names_lock = threading.Lock()
+
+
+def _resolve_tags(c, lang, tag_ids=None):
+    """
+    Returns the names and descriptions of the tags in `lang`, falling back to the ones the tags
+    were created with.
+    """
+
+    ids_filter = ("" if tag_ids is None
+                  else f"WHERE t.tag_id IN ({', '.join('?' * len(tag_ids))})")
+    c.execute(f"SELECT t.tag_id, COALESCE(tt.name, t.name), "
+              f"COALESCE(tt.description, t.description) "
+              f"FROM tags AS t "
+              f"LEFT JOIN tag_translations AS tt ON tt.tag_id = t.tag_id AND tt.lang = ? "
+              f"{ids_filter};",
+              (lang, *(tag_ids or ())))
+
+    return { tag_id: (name, description) for tag_id, name, description in c }
+
+
+def _tag_names_in(c, lang):
+    """
+    Returns the resolved names and descriptions of the tags of the current library in `lang`.
+    The map is built once, then only the tags mentioned by the change log are resolved again.
+    """
+
+    key = (g.db_library, lang)
+    with _tag_names_lock:
+        cached = _tag_names.get(key)
+
+    logged = None if cached is None else _read_changes(c, cached[0], -1)
+    if logged is None:
+        # Read the sequence number first, the changes made meanwhile are resolved again later
+        seq = _last_change(c)
+        names = _resolve_tags(c, lang)
+    else:
+        seq, names = cached
+        changed = set()
+        for seq, kind, details in logged:
+            details = json.loads(details)
+            if kind == "tagCreated":
+                changed.add(details["id"])
+            elif kind == "tagUpdated" and details["field"] in ("name", "description"):
+                changed.add(details["tagId"])
+            elif kind in ("tagsMerged", "tagsRemoved"):
+                changed.update(details["removed"])
+
+        if changed:
+            # Copied, the other threads may be reading the cached map
+            names = dict(names)
+            resolved = _resolve_tags(c, lang, list(changed))
+            for tag_id in changed:
+                if tag_id in resolved:
+                    names[tag_id] = resolved[tag_id]
+                else:
+                    names.pop(tag_id, None)
+
+    with _tag_names_lock:
+        _tag_names[key] = (seq, names)
+
+    return names
+
+
+# Per library: a connection watching the database for commits and the generations last read
+_generation_watchers = {}
+_generation_watchers_lock = threading.Lock()
+
+
+def _cache_generations(library):
+    """
+    Returns the generations of the cache namespaces of a library. A connection of its own sees the
+    commits of every other connection, of this process or another one, through `data_version`, so
+    the generations are only read again after a commit.
+    """
+
+    with _generation_watchers_lock:
+        watcher = _generation_watchers.get(library)
+        if watcher is None:
+            watcher = _generation_watchers[library] = {
+                "db": sqlite3.connect(_libraries()[library]["DATABASE"], check_same_thread=False),
+                "dataVersion": None,
+                "generations": {},
+            }
+
+        data_version = watcher["db"].execute("PRAGMA data_version;").fetchone()[0]
+        if data_version != watcher["dataVersion"]:
+            watcher["generations"] = dict(watcher["db"].execute(
+                "SELECT namespace, generation FROM cache_generations;"))
+            watcher["dataVersion"] = data_version
+
+        return watcher["generations"]
+
+
+class _QueryCache:
+    """
+    LRU of values read from the databases of the libraries. Every value is stored with the
+    generations of the cache namespaces it was read from, and read again once one of them changed,
+    whichever process made the change.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+        }
+
+    def get(self, library, namespaces, key, compute):
+        """Returns the value cached for `key`, calling `compute` when it is missing or stale."""
+
+        generations = _cache_generations(library)
+        version = tuple(generations.get(namespace, 0) for namespace in namespaces)
+        key = (library, key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[1]
+            self._counters["misses" if entry is None else "stale"] += 1
+
+        # Read after the generations, so the value is at least as recent as them
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def evict(self, library):
+        """Drops the values read from the database of `library`."""
+
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == library]:
+                del self._entries[key]
+
+    def stats(self):
+        """Returns the number of cached values and the hit/miss counters."""
+
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                **self._counters,
+            }
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def _get_query_cache():
+    global _query_cache # pylint: disable=global-statement
+
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = _QueryCache(current_app.config.get("QUERY_CACHE_ENTRIES", 256))
+
+    return _query_cache
+
+
 @click.command('init-db')
+@_library_option()
 def init_db_command():
     """Clear existing database and (re)create tables."""
 
@@ -53,10 +608,91 @@ def init_db_command():
 
     with current_app.open_resource(os.path.join('resources', 'schema.sql')) as s:
         db.executescript(s.read().decode('utf-8'))
+    _migrate(db)
 
     click.echo("Initialized the database.")
 
 
+@click.command('migrate')
+@_library_option(all_by_default=True)
+def migrate_command():
+    """Upgrade the database schema, keeping the existing data."""
+
+    for library in [g.library] if g.library else _libraries():
+        db = sqlite3.connect(_libraries()[library]["DATABASE"])
+        try:
+            applied = _migrate(db)
+            version = db.execute("PRAGMA user_version;").fetchone()[0]
+        finally:
+            db.close()
+
+        for migration in applied:
+            click.echo(f"    ✔ Applied migration {migration} to library \"{library}\".")
+        click.echo(f"Library \"{library}\" is at schema version {version}.")
+
+
+def _database_size(db, path):
+    wal_path = f"{path}-wal"
+
+    return {
+        "file": os.path.getsize(path),
+        "wal": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        "pages": db.execute("PRAGMA page_count;").fetchone()[0],
+        "free pages": db.execute("PRAGMA freelist_count;").fetchone()[0],
+    }
+
+
+@click.command('maintain')
+@_library_option(all_by_default=True)
+@click.option('--vacuum', is_flag=True,
+              help="Rebuild the database files, enabling incremental vacuuming from then on.")
+def maintain_command(vacuum):
+    """Refresh the query planner statistics, reclaim free pages and checkpoint the WAL."""
+
+    for library in [g.library] if g.library else _libraries():
+        path = _libraries()[library]["DATABASE"]
+        click.echo(f"Maintaining library \"{library}\" ({path}):")
+
+        db = sqlite3.connect(path, isolation_level=None)
+        try:
+            before = _database_size(db, path)
+            _migrate(db)
+
+            c = db.cursor()
+            db.execute("BEGIN")
+            removed = _compact_changes(c)
+            db.commit()
+            c.close()
+            click.echo(f"    ✔ Compacted the change log ({removed} changes removed).")
+
+            db.execute("ANALYZE;")
+            db.execute("PRAGMA optimize;")
+            click.echo("    ✔ Refreshed the query planner statistics.")
+
+            if vacuum:
+                db.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+                db.execute("VACUUM;")
+                click.echo("    ✔ Rebuilt the database file.")
+            elif db.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2:
+                db.execute("PRAGMA incremental_vacuum;").fetchall()
+                click.echo("    ✔ Released the free pages.")
+            else:
+                click.echo("    ✘ Incremental vacuuming is not enabled, "
+                           "run this command once with --vacuum to enable it.")
+
+            if db.execute("PRAGMA journal_mode;").fetchone()[0] == "wal":
+                busy, *_ = db.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchone()
+                click.echo("    ✘ The WAL checkpoint could not complete, the database is in use."
+                           if busy else "    ✔ Checkpointed the WAL.")
+
+            after = _database_size(db, path)
+        finally:
+            db.close()
+
+        for key, value in before.items():
+            click.echo(f"    {key}: {value} -> {after[key]}")
+
+
 @click.command('bump-resources-version')
 def bump_resources_version():
     """Bump version of resources files when no changes that affect localization were made."""
@@ -66,9 +702,15 @@ def bump_resources_version():
         'tag_management',
         'images',
         'search_images',
+        'saved_searches',
+        'add_saved_search',
+        'delete_saved_search',
+        'saved_search',
+        'similar_images',
         'load_image',
         'tags',
         'image_tags',
+        'suggest_tags',
         "translate_tags",
         'add_tag',
         'toggle_tags',
@@ -77,6 +719,10 @@ def bump_resources_version():
         'de_duplicate',
         'delete_tags',
         'latest',
+        'untagged_images',
+        'metrics',
+        'changes',
+        'change_feed',
         # common is not an endpoint but we should also bump it's version
         'common',
     ]
@@ -108,16 +754,41 @@ def bump_resources_version():
         click.echo("✔ Version bump complete.")
 
 
+def _merge_recursively(a: dict, b: dict):
+    for key, value in b.items():
+        if key in a and isinstance(a[key], dict) and isinstance(value, dict):
+            _merge_recursively(a[key], value)
+        else:
+            a[key] = value
+
+
+def _resources_file(name, lang):
+    """Returns the path and modification time of the resources file of `name` in `lang`."""
+
+    path = os.path.join(current_app.root_path, "resources", f"{name}-{VERSION}.{lang}.json")
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        # Safety fallback in case the file is missing
+        path = os.path.join(current_app.root_path, "resources", f"{name}-{VERSION}.{DEFAULT_LANG}.json")
+        return path, os.stat(path).st_mtime_ns
+
+
+@functools.lru_cache(maxsize=256)
+def _load_resources(path, mtime_ns, common_path, common_mtime_ns): # pylint: disable=unused-argument
+    """Loads a resources file merged with the common one, cached until one of them changes."""
+
+    with open(path, encoding="utf-8") as f:
+        resources = json.load(f)
+    with open(common_path, encoding="utf-8") as f:
+        _merge_recursively(resources, json.load(f))
+
+    return resources
+
+
 def with_localization(func):
     """Wrapper method used for annotating endpoints for localization."""
 
-    def merge_recursively(a: dict, b: dict):
-        for key, value in b.items():
-            if key in a and isinstance(a[key], dict) and isinstance(value, dict):
-                merge_recursively(a[key], value)
-            else:
-                a[key] = value
-
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         # Detect best match from Accept-Language headers
@@ -127,27 +798,15 @@ def with_localization(func):
         if lang is None:
             lang = DEFAULT_LANG
 
-        # Load JSON resource file
-        filename = os.path.join("resources", f"{request.endpoint}-{VERSION}.{lang}.json")
-        default = os.path.join("resources", f"{request.endpoint}-{VERSION}.{DEFAULT_LANG}.json")
-        try:
-            with current_app.open_resource(filename, "r", encoding="utf-8") as f:
-                resources = json.load(f)
-        except FileNotFoundError:
-            # Safety fallback in case the file is missing
-            with current_app.open_resource(default, "r", encoding="utf-8") as f:
-                resources = json.load(f)
+        # Load the JSON resource file merged with the common one (shared, never modify them)
+        resources = _load_resources(*_resources_file(request.endpoint, lang),
+                                    *_resources_file("common", lang))
 
-        # Load common JSON resource file
-        filename = os.path.join("resources", f"common-{VERSION}.{lang}.json")
-        default = os.path.join("resources", f"common-{VERSION}.{DEFAULT_LANG}.json")
-        try:
-            with current_app.open_resource(filename, "r", encoding="utf-8") as f:
-                merge_recursively(resources, json.load(f))
-        except FileNotFoundError:
-            # Safety fallback in case the file is missing
-            with current_app.open_resource(default, "r", encoding="utf-8") as f:
-                merge_recursively(resources, json.load(f))
+        # Select the library the request works on
+        library = request.args.get("library", None) or _default_library()
+        if library not in _libraries():
+            return abort(404, resources.get("validation").get("library not in _libraries()"))
+        g.library = library
 
         # Pass resources as a keyword argument
         return func(*args, lang=lang, resources=resources, **kwargs)
@@ -156,181 +815,2032 @@ def with_localization(func):
 
 app.teardown_appcontext(_release_db)
 app.cli.add_command(init_db_command)
+app.cli.add_command(migrate_command)
+app.cli.add_command(maintain_command)
 app.cli.add_command(bump_resources_version)
 
 
-def _error_image(status, message):
-    img_w, img_h = 1920, 1080
-    img = Image.new('RGB', (img_w, img_h), color='rgb(198, 198, 198)')
-    font = ImageFont.truetype(os.path.join("resources", "RobotoMono-Regular.ttf"), size=72.0)
-    text = '\n'.join([f"HTTP ERROR {status}"] + textwrap.wrap(message, 80))
-    draw = ImageDraw.Draw(img)
-    _, _, w, h = draw.textbbox((0, 0), text, font=font, align='center')
-    draw.text(((img_w - w) / 2, (img_h - h) / 2), text,
-              font=font, align='center', fill='rgb(255, 0, 255)')
-    img_io = BytesIO()
-    img.save(img_io, format='JPEG', quality=85)
-    img_io.seek(0)
+class ImagePoolSaturated(Exception):
+    """Raised when the image pool queue is full and no more work can be accepted."""
 
-    return img_io
 
+class ImageTooLarge(Exception):
+    """Raised when decoding an image would need more memory than the whole decode budget."""
 
-@app.errorhandler(400)
-@app.errorhandler(404)
-@app.errorhandler(500)
-def server_error(err):
-    """Handle errors gracefully."""
 
-    lang = request.accept_languages.best_match(SUPPORTED_LANGS.keys())
-    if lang is None:
-        lang = DEFAULT_LANG
+def _open_image(path: str):
+    """
+    Opens an image with Pillow. Pillow is only imported on first use: most commands and endpoints
+    never touch an image. The decompression bomb limit is set here and not at import time so that
+    it also applies in the image pool processes.
+    """
 
-    if request.endpoint == 'load_image':
-        img_io = _error_image(err.code, err.description)
-        response = send_file(
-            img_io,
-            mimetype='image/jpeg',
-            as_attachment=False,
-            max_age=300
-        )
+    from PIL import Image  # pylint: disable=import-outside-toplevel
 
-        return response, err.code, { "Content-Language": lang }
+    if "IMAGE_MAX_SOURCE_PIXELS" in app.config:
+        Image.MAX_IMAGE_PIXELS = app.config["IMAGE_MAX_SOURCE_PIXELS"]
 
-    return jsonify({
-        "error": {
-            "code": err.code,
-            "name": err.name,
-        },
-        "reason": err.description,
-    }), err.code, { "Content-Language": lang }
+    return Image.open(path)
+
+
+def _decode_box(size, make_thumbnail: bool, max_pixels: int):
+    """
+    Returns the smallest box the decoded image must cover to produce its rendition, or None when
+    the image is decoded at full size.
+    """
+
+    width, height = size
+    if make_thumbnail:
+        # The thumbnail fits in 192x108 once the image is turned, whichever way it is turned
+        return (192, 192)
+    if width * height <= max_pixels:
+        return None
+
+    scale = (max_pixels / (width * height)) ** 0.5
+
+    return (max(1, int(width * scale)), max(1, int(height * scale)))
+
+
+def _decode_plan(path: str, make_thumbnail: bool, max_pixels: int, max_bytes: int):
+    """
+    Returns the box the decoding of an image is reduced to (None to decode it at full size) and
+    the estimated memory of the decoded pixels (width × height × bands), read from the header.
+    Formats that support it (JPEG decodes at 1/2, 1/4 or 1/8 of the size) decode oversized sources
+    at a reduced size, halved again while the decoded image does not fit in `max_bytes`.
+    """
+
+    with _open_image(path) as img:
+        box = _decode_box(img.size, make_thumbnail, max_pixels)
+
+    previous = None
+    while True:
+        with _open_image(path) as img:
+            if box is not None:
+                # Only configures the decoder, nothing is decoded yet
+                img.draft("RGB", box)
+            decoded = img.size
+            cost = img.width * img.height * len(img.getbands())
+
+        # Stop when it fits, or when the format can not reduce the size any further
+        if cost <= max_bytes or decoded == previous:
+            return box, cost
+
+        previous = decoded
+        box = (max(1, decoded[0] // 2), max(1, decoded[1] // 2))
+
+
+def _render_image(path: str, make_thumbnail: bool, output_format: str = "JPEG",
+                  max_pixels: int = 7680 * 4320, box=None) -> bytes:
+    """Decodes, optionally resizes and encodes an image (runs in the image pool)."""
+
+    from PIL import Image, ImageOps  # pylint: disable=import-outside-toplevel
+
+    with _open_image(path) as img:
+        # Decode oversized sources at a reduced size when the format supports it
+        if box is not None:
+            img.draft("RGB", box)
+
+        # Turn the image as the camera says it was held
+        ImageOps.exif_transpose(img, in_place=True)
+
+        # Convert to RGB (JPEG doesn’t support RGBA or P)
+        img = img.convert("RGB")
+
+        # If tn=true, make a thumbnail, otherwise keep the image within max_pixels
+        if make_thumbnail:
+            img.thumbnail((192, 108), Image.Resampling.LANCZOS)
+        elif img.width * img.height > max_pixels:
+            img.thumbnail(_decode_box(img.size, False, max_pixels), Image.Resampling.LANCZOS)
+
+        # Write image to memory buffer in the negotiated format
+        img_io = BytesIO()
+        img.save(img_io, format=output_format, **OUTPUT_FORMATS[output_format][1])
+
+        return img_io.getvalue()
+
+
+def _input_formats():
+    """
+    Returns the enabled input formats. Pillow is not asked whether it can decode them, that would
+    load it (and all its plugins) for a mere listing: the image pool answers when decoding.
+    """
+
+    names = current_app.config.get("IMAGE_INPUT_FORMATS", INPUT_FORMATS.keys())
+
+    return { name: INPUT_FORMATS[name] for name in names if name in INPUT_FORMATS }
+
+
+def _sniff_format(path, formats=None):
+    """
+    Returns the name of the input format matching the file header, or None. Only the enabled
+    input formats are recognized, unless other `formats` are given.
+    """
+
+    with open(path, "rb") as f:
+        header = f.read(16)
+
+    for name, (_, signature) in (_input_formats() if formats is None else formats).items():
+        if signature.match(header):
+            return name
+
+    return None
+
+
+@functools.cache
+def _can_encode(name: str) -> bool:
+    """
+    Tells whether Pillow was built with the encoder of an output format. `Image.SAVE` can not
+    tell: Pillow only registers the plugins of the less common formats once it needs them.
+    """
+
+    from PIL import features  # pylint: disable=import-outside-toplevel
+
+    return bool(features.check(OUTPUT_FORMATS[name][2]))
+
+
+def _negotiate_output_format():
+    """Picks the first configured output format explicitly accepted by the client."""
+
+    names = current_app.config.get("IMAGE_OUTPUT_FORMATS", OUTPUT_FORMATS.keys())
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+
+    for name in names:
+        if (name in OUTPUT_FORMATS
+                and OUTPUT_FORMATS[name][0] in accepted
+                and _can_encode(name)):
+            return name
+
+    return "JPEG"
+
+
+class _DecodeBudget:
+    """
+    Admits decoding work by the estimated memory of the decoded pixels, so that a few huge images
+    decoded at the same time can not exhaust the memory of the image pool.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._condition = threading.Condition()
+        self._used = 0
+        self._counters = {
+            "peakBytes": 0,
+            "admitted": 0,
+            "waited": 0,
+            "timedOut": 0,
+        }
+
+    def acquire(self, cost: int, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for `cost` bytes of the budget, returns False if it timed out."""
+
+        if cost > self.max_bytes:
+            raise ImageTooLarge()
+
+        with self._condition:
+            def fits():
+                return self._used + cost <= self.max_bytes
+
+            if not fits():
+                if timeout <= 0:
+                    return False
+                self._counters["waited"] += 1
+                if not self._condition.wait_for(fits, timeout):
+                    self._counters["timedOut"] += 1
+                    return False
+
+            self._used += cost
+            self._counters["admitted"] += 1
+            self._counters["peakBytes"] = max(self._counters["peakBytes"], self._used)
+
+            return True
+
+    def release(self, cost: int):
+        with self._condition:
+            self._used -= cost
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "maxBytes": self.max_bytes,
+                "usedBytes": self._used,
+                **self._counters,
+            }
+
+
+class _ImagePool:
+    """
+    Bounded process pool for the CPU-bound image work, so that decoding does not starve the
+    WSGI worker threads serving the JSON endpoints.
+
+    Identical requests that are already in flight share the same future instead of being
+    decoded twice. When more than `workers + max_queue` renditions are in flight, or when the
+    decode budget does not free up in time, new work is rejected with `ImagePoolSaturated`.
+    """
+
+    def __init__(self, workers: int, max_queue: int, budget: _DecodeBudget, budget_wait: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.budget = budget
+        self.budget_wait = budget_wait
+        self._lock = threading.RLock()
+        self._executor = None
+        self._in_flight = {}
+        self._latencies = deque(maxlen=1024)
+        self._counters = {
+            "submitted": 0,
+            "coalesced": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "peakDepth": 0,
+        }
+
+    def _done(self, key, started, cost, future):
+        from concurrent.futures.process import BrokenProcessPool  # pylint: disable=import-outside-toplevel
+
+        self.budget.release(cost)
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._latencies.append(time.perf_counter() - started)
+            if future.cancelled() or future.exception() is not None:
+                self._counters["failed"] += 1
+            else:
+                self._counters["completed"] += 1
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                # A worker died; start over with a fresh pool on the next submission
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+
+    def submit(self, key, func, *args, cost: int = 0, wait: float | None = None):
+        """
+        Schedules `func(*args)` unless an identical `key` is already in flight, once `cost` bytes
+        of the decode budget are available (waiting `wait` seconds at most).
+        """
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return future
+
+            if len(self._in_flight) >= self.workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise ImagePoolSaturated()
+
+        # Not holding the lock, the work finishing meanwhile has to release its budget
+        if not self.budget.acquire(cost, self.budget_wait if wait is None else wait):
+            with self._lock:
+                self._counters["rejected"] += 1
+            raise ImagePoolSaturated()
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.budget.release(cost)
+                self._counters["coalesced"] += 1
+                return future
+
+            if self._executor is None:
+                from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+            try:
+                future = self._executor.submit(func, *args)
+            except BaseException:
+                self.budget.release(cost)
+                raise
+            self._in_flight[key] = future
+            self._counters["submitted"] += 1
+            self._counters["peakDepth"] = max(self._counters["peakDepth"],
+                                              len(self._in_flight))
+            future.add_done_callback(functools.partial(self._done, key, time.perf_counter(), cost))
+
+            return future
+
+    def submit_idle(self, key, func, *args, cost: int = 0):
+        """Low priority variant of `submit`, returns None instead of queueing behind other work."""
+
+        with self._lock:
+            if key not in self._in_flight and len(self._in_flight) >= self.workers:
+                return None
+
+            try:
+                return self.submit(key, func, *args, cost=cost, wait=0)
+            except ImagePoolSaturated:
+                return None
+
+    def stats(self):
+        """Returns queue depth, counters and latency percentiles (in milliseconds)."""
+
+        with self._lock:
+            depth = len(self._in_flight)
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            "workers": self.workers,
+            "maxQueue": self.max_queue,
+            "depth": depth,
+            "queued": max(0, depth - self.workers),
+            **counters,
+            "decodeBudget": self.budget.stats(),
+            "latencyMs": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": percentile(1.0),
+            },
+        }
+
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+
+def _server_processes():
+    """
+    Returns the number of processes serving the application: `SERVER_PROCESSES`, or the
+    `WEB_CONCURRENCY` environment variable also read by gunicorn.
+    """
+
+    return max(1, int(current_app.config.get("SERVER_PROCESSES",
+                                             os.environ.get("WEB_CONCURRENCY", 1))))
+
+
+def _get_image_pool():
+    global _image_pool # pylint: disable=global-statement
+
+    with _image_pool_lock:
+        if _image_pool is None:
+            # Every serving process has a pool of its own, the limits are shared among them
+            processes = _server_processes()
+            total_workers = current_app.config.get("IMAGE_POOL_WORKERS", os.cpu_count() or 1)
+            workers = max(1, total_workers // processes)
+            max_queue = max(1, current_app.config.get("IMAGE_POOL_MAX_QUEUE", 4 * total_workers)
+                            // processes)
+            budget = _DecodeBudget(current_app.config.get("IMAGE_DECODE_BUDGET", 512 * 1024 ** 2)
+                                   // processes)
+            budget_wait = current_app.config.get("IMAGE_DECODE_WAIT", 10)
+            _image_pool = _ImagePool(workers, max_queue, budget, budget_wait)
+
+    return _image_pool
+
+
+class _RenditionCache:
+    """LRU of encoded renditions, bounded by the total size of the cached bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "prefetched": 0,
+            "evictions": 0,
+        }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Returns the cached bytes for `key`, or None."""
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return data
+
+    def put(self, key, data: bytes, prefetched: bool = False):
+        """Stores `data`, evicting the least recently used renditions to stay within budget."""
+
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            if prefetched:
+                self._counters["prefetched"] += 1
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._counters["evictions"] += 1
+
+    def evict(self, predicate):
+        """Drops the renditions whose key matches `predicate`."""
+
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._size -= len(self._entries.pop(key))
+                self._counters["evictions"] += 1
+
+    def stats(self):
+        """Returns the size of the cache and its hit/miss counters."""
+
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "maxBytes": self.max_bytes,
+                **self._counters,
+            }
+
+
+class _SharedRenditionCache:
+    """
+    Renditions stored as files of a folder shared by the worker processes and read through memory
+    maps, so the operating system keeps a single copy of them in its page cache however many
+    workers serve them. Bounded by the total size of the files, the least recently used go first:
+    every process trims the folder after writing an eighth of the budget. The key of every
+    rendition is stored next to it, in a `.key` file, for `evict`.
+    """
+
+    def __init__(self, folder: str, max_bytes: int):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._written = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "prefetched": 0,
+            "evictions": 0,
+        }
+        # The folder outlives the processes, and the budget may have changed since
+        self._trim()
+
+    def _path(self, key):
+        return os.path.join(self.folder, hashlib.sha1(repr(key).encode("utf-8")).hexdigest())
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """Returns a read-only memory map of the cached rendition for `key`, or None."""
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # The modification time orders the files for the eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+
+        with self._lock:
+            self._counters["hits"] += 1
+
+        return data
+
+    def put(self, key, data: bytes, prefetched: bool = False):
+        """Stores `data`, evicting the least recently used renditions to stay within budget."""
+
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        try:
+            self._write(path, data)
+            self._write(f"{path}.key", json.dumps(key).encode("utf-8"))
+        except OSError:
+            # Also called back by the image pool, outside of any application context
+            app.logger.warning("Could not store rendition %s.", path, exc_info=True)
+            return
+
+        with self._lock:
+            if prefetched:
+                self._counters["prefetched"] += 1
+            self._written += len(data)
+            trim = self._written > self.max_bytes // 8
+            if trim:
+                self._written = 0
+
+        if trim:
+            self._trim()
+
+    @staticmethod
+    def _write(path, data: bytes):
+        # Written aside then renamed, other workers never map a partial file
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(temp)
+            raise
+
+    def _files(self):
+        files = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.endswith((".tmp", ".key")):
+                    continue
+                with contextlib.suppress(FileNotFoundError):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        return files
+
+    def _remove(self, path):
+        """
+        Deletes a rendition and its key. Returns False when it could not be deleted; a rendition
+        already deleted by another process counts as deleted.
+        """
+
+        # Maps already open in a worker keep their pages until they are closed
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+        else:
+            with self._lock:
+                self._counters["evictions"] += 1
+
+        with contextlib.suppress(OSError):
+            os.remove(f"{path}.key")
+
+        return True
+
+    def _trim(self):
+        files = sorted(self._files())
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in files:
+            if size <= self.max_bytes:
+                break
+            if self._remove(path):
+                size -= file_size
+
+    def evict(self, predicate):
+        """Deletes the renditions whose key matches `predicate`."""
+
+        with os.scandir(self.folder) as entries:
+            key_files = [entry.path for entry in entries if entry.name.endswith(".key")]
+
+        for key_file in key_files:
+            try:
+                with open(key_file, encoding="utf-8") as f:
+                    key = tuple(json.load(f))
+            except (OSError, ValueError):
+                continue
+            if predicate(key):
+                self._remove(key_file[:-len(".key")])
+
+    def stats(self):
+        """Returns the size of the cache folder and the hit/miss counters of this worker."""
+
+        files = self._files()
+        with self._lock:
+            return {
+                "entries": len(files),
+                "bytes": sum(file_size for _, file_size, _ in files),
+                "maxBytes": self.max_bytes,
+                "folder": self.folder,
+                **self._counters,
+            }
+
+
+_rendition_cache = None
+
+
+def _rendition_key(path, make_thumbnail, output_format):
+    """Identifies a rendition of the current version of the file at `path`."""
+
+    stat = os.stat(path)
+
+    return (path, stat.st_mtime_ns, stat.st_size, make_thumbnail, output_format)
+
+
+def _get_rendition_cache():
+    global _rendition_cache # pylint: disable=global-statement
+
+    with _image_pool_lock:
+        if _rendition_cache is None:
+            max_bytes = current_app.config.get("RENDITION_CACHE_BYTES", 64 * 1024 * 1024)
+            shared_folder = current_app.config.get("RENDITION_SHARED_CACHE_FOLDER")
+            _rendition_cache = (_SharedRenditionCache(shared_folder, max_bytes) if shared_folder
+                                else _RenditionCache(max_bytes))
+
+    return _rendition_cache
+
+
+def _cache_rendition(cache, key, future):
+    if not future.cancelled() and future.exception() is None:
+        cache.put(key, future.result(), prefetched=True)
+
+
+_image_listings = {}
+
+
+def _list_image_files(folder):
+    """Returns the sorted image file names of `folder`, by extension, cached until the folder changes."""
+
+    extensions = frozenset(ext for exts, _ in _input_formats().values() for ext in exts)
+    mtime = os.stat(folder).st_mtime_ns
+    cached = _image_listings.get(folder)
+    if cached is not None and cached[0] == (mtime, extensions):
+        return cached[1]
+
+    listing = [
+        fn for fn in sorted(os.listdir(folder))
+        if os.path.isfile(os.path.join(folder, fn))
+        and os.path.splitext(fn)[-1].lower() in extensions
+    ]
+    _image_listings[folder] = ((mtime, extensions), listing)
+
+    return listing
+
+
+def _list_images(folder):
+    """
+    Returns the sorted image file names of the current library, leaving out the indexed files
+    whose content is not in an enabled input format. The files not indexed yet are only
+    recognized by their extension.
+    """
+
+    db = _get_db()
+    mtime = os.stat(folder).st_mtime_ns
+    listing = _list_image_files(folder)
+    enabled = tuple(_input_formats())
+
+    def listable():
+        c = db.execute(
+            f"SELECT fn FROM image_files WHERE format NOT IN ({','.join('?' * len(enabled))});",
+            enabled
+        )
+        rejected = {fn for fn, in c}
+
+        return [fn for fn in listing if fn not in rejected] if rejected else listing
+
+    return _get_query_cache().get(g.db_library, ("imageFiles",),
+                                  ("listImages", folder, mtime, enabled), listable)
+
+
+def _listed_images(folder):
+    """Returns the file names listed by `_list_images` as a set, cached like the listing."""
+
+    # Selects the library of the cache key, g.db_library
+    _get_db()
+    mtime = os.stat(folder).st_mtime_ns
+    enabled = tuple(_input_formats())
+
+    return _get_query_cache().get(g.db_library, ("imageFiles",),
+                                  ("listedImages", folder, mtime, enabled),
+                                  lambda: frozenset(_list_images(folder)))
+
+
+def _missing_image_files(folder):
+    """
+    Returns the indexed image files that were deleted from `folder` since the index was last
+    updated, cached until the folder or the index changes.
+    """
+
+    db = _get_db()
+    mtime = os.stat(folder).st_mtime_ns
+
+    def missing():
+        on_disk = set(_list_image_files(folder))
+
+        return [fn for fn, in db.execute("SELECT fn FROM image_files;") if fn not in on_disk]
+
+    return _get_query_cache().get(g.db_library, ("imageFiles",),
+                                  ("missingImageFiles", folder, mtime), missing)
+
+
+def _prefetch_image(path: str, make_thumbnail: bool, output_format: str, max_pixels: int,
+                   max_bytes: int) -> bytes:
+    """Plans and renders a prefetched image (runs in the image pool), within `max_bytes`."""
+
+    box, cost = _decode_plan(path, make_thumbnail, max_pixels, max_bytes)
+    if cost > max_bytes:
+        raise ImageTooLarge()
+
+    return _render_image(path, make_thumbnail, output_format, max_pixels, box)
+
+
+def _prefetch_neighbours(folder, neighbours, make_thumbnail, output_format):
+    """
+    Warms the rendition cache with the `neighbours` the pager shows next, in the order of its own
+    listing (the next images in the browsing direction, then the previous one), but only using
+    pool workers that would otherwise be idle. Nothing is opened in the request thread: the images
+    are planned and decoded by the workers, each one within the share of the decode budget of a
+    single worker.
+    """
+
+    depth = current_app.config.get("PREFETCH_DEPTH", 2)
+    if depth <= 0 or not neighbours:
+        return
+
+    # Only the images of the library, whatever the client sends
+    listing = _listed_images(folder)
+
+    pool = _get_image_pool()
+    cache = _get_rendition_cache()
+    max_pixels = current_app.config.get("IMAGE_MAX_PIXELS", 7680 * 4320)
+    max_bytes = pool.budget.max_bytes // pool.workers
+    for fn in neighbours[:depth + 1]:
+        if fn not in listing:
+            continue
+        path = os.path.join(folder, fn)
+        try:
+            key = _rendition_key(path, make_thumbnail, output_format)
+        except OSError:
+            continue
+        if key in cache:
+            continue
+        future = pool.submit_idle(key, _prefetch_image, path, make_thumbnail, output_format,
+                                  max_pixels, max_bytes, cost=max_bytes)
+        if future is None:
+            break
+        future.add_done_callback(functools.partial(_cache_rendition, cache, key))
+
+
+def _exif_date(value):
+    """Converts an EXIF date ("YYYY:MM:DD HH:MM:SS") to "YYYY-MM-DD HH:MM:SS", or None."""
+
+    if not isinstance(value, str) or not re.match(r"^\d{4}:\d{2}:\d{2} \d{2}:\d{2}:\d{2}", value):
+        return None
+
+    return f"{value[:10].replace(':', '-')}{value[10:19]}"
+
+
+def _index_image_file(path: str):
+    """
+    Reads the metadata of an image and encodes a ~16x9 preview of it as a WebP (or JPEG) data URI
+    (runs in the indexing pool). Returns None for the files that can not be decoded.
+    """
+
+    from PIL import ExifTags, Image, ImageOps, features  # pylint: disable=import-outside-toplevel
+
+    try:
+        with _open_image(path) as img:
+            exif = img.getexif()
+            orientation = exif.get(ExifTags.Base.Orientation, 1)
+            width, height = img.size
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+
+            details = exif.get_ifd(ExifTags.IFD.Exif)
+            taken = _exif_date(details.get(ExifTags.Base.DateTimeOriginal,
+                                           exif.get(ExifTags.Base.DateTime)))
+            make = str(exif.get(ExifTags.Base.Make, "")).strip("\x00 ")
+            model = str(exif.get(ExifTags.Base.Model, "")).strip("\x00 ")
+            # Most models already start with the name of the maker
+            camera = (model if model.startswith(make) else f"{make} {model}").strip() or None
+
+            # Let the JPEG decoder scale down while decoding, we only need a few pixels
+            img.draft("RGB", (64, 64))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            img.thumbnail((16, 16), Image.Resampling.BOX)
+
+            # The most common color of a reduced palette
+            palette = img.quantize(colors=4, method=Image.Quantize.MEDIANCUT)
+            _, index = max(palette.getcolors())
+            color = "#{:02x}{:02x}{:02x}".format(*palette.getpalette()[index * 3:index * 3 + 3])
+
+            # JPEG when Pillow was built without WebP support
+            placeholder_format = "WEBP" if features.check("webp") else "JPEG"
+            img_io = BytesIO()
+            try:
+                img.save(img_io, format=placeholder_format, quality=50)
+                placeholder = (f"data:{OUTPUT_FORMATS[placeholder_format][0]};base64,"
+                               f"{base64.b64encode(img_io.getvalue()).decode('ascii')}")
+            except (KeyError, OSError):
+                # The metadata is still worth indexing, the listing shows no placeholder
+                placeholder = None
+
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+    return {
+        "placeholder": placeholder,
+        "width": width,
+        "height": height,
+        "orientation": orientation,
+        "taken": taken,
+        "camera": camera,
+        "color": color,
+    }
+
+
+def _image_features(path: str):
+    """
+    Computes the feature vector of an image, compared with the cosine similarity (runs in the
+    indexing pool). Returns None for the files that can not be decoded.
+    """
+
+    from PIL import Image, ImageChops, ImageFilter, ImageOps  # pylint: disable=import-outside-toplevel
+
+    try:
+        with _open_image(path) as img:
+            img.draft("RGB", (128, 128))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            img.thumbnail((64, 64), Image.Resampling.BOX)
+
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+    # Joint histogram of the colors, with 4 levels per channel: rrggbb
+    red, green, blue = (band.point(lambda v, shift=shift: (v >> 6) << shift)
+                        for band, shift in zip(img.split(), (4, 2, 0)))
+    colors = ImageChops.add(ImageChops.add(red, green), blue).histogram()[:64]
+
+    gray = img.convert("L")
+    edges = gray.filter(ImageFilter.FIND_EDGES)
+    strengths = edges.histogram()
+    strengths = [sum(strengths[i:i + 16]) for i in range(0, 256, 16)]
+    layout = list(edges.resize((4, 4), Image.Resampling.BOX).getdata())
+
+    # Centered, so that the same picture a bit brighter or darker still matches
+    thumbnail = list(gray.resize((8, 8), Image.Resampling.BOX).getdata())
+    mean = sum(thumbnail) / len(thumbnail)
+    thumbnail = [v - mean for v in thumbnail]
+
+    # Square roots of the histograms, their dot product is then the Bhattacharyya coefficient.
+    # Every part weighs the same, and the whole vector has a unit length.
+    vector = []
+    for part in ([v ** 0.5 for v in colors], [v ** 0.5 for v in strengths], layout, thumbnail):
+        norm = sum(v * v for v in part) ** 0.5
+        vector.extend(v / norm / 2 if norm else 0.0 for v in part)
+
+    return vector
+
+
+def _feature_matrix_path(library):
+    return f"{_libraries()[library]['DATABASE']}.features-v{FEATURE_VERSION}.f16"
+
+
+def _open_feature_matrix(path, rows=0):
+    """
+    Maps the feature matrix of a library, a float16 row of FEATURE_SIZE per file_id. When `rows` is
+    given, the matrix is opened for writing and grown (creating it if needed) to hold that many.
+    """
+
+    import numpy  # pylint: disable=import-outside-toplevel
+
+    row_bytes = FEATURE_SIZE * 2
+    if rows:
+        with open(path, "ab") as f:
+            size = f.tell()
+            if size < rows * row_bytes:
+                # Grow by half at least, the matrix is not remapped for every new image
+                f.truncate(max(rows, size // row_bytes * 3 // 2, 1024) * row_bytes)
+
+    size = os.path.getsize(path)
+    if size < row_bytes:
+        return None
+
+    return numpy.memmap(path, dtype=numpy.float16, mode="r+" if rows else "r",
+                        shape=(size // row_bytes, FEATURE_SIZE))
+
+
+def _index_features(db, folder, executor, batch_size, removed_ids):
+    """Stores the feature vectors of the files added or changed since the last run."""
+
+    last_id = db.execute("SELECT max(file_id) FROM image_files;").fetchone()[0] or 0
+    try:
+        matrix = _open_feature_matrix(_feature_matrix_path(_current_library()), last_id + 1)
+    except ImportError:
+        click.echo("The numpy package is not installed, the images were not indexed for the "
+                   "similarity search.")
+        return
+
+    pending = db.execute("SELECT file_id, fn FROM image_files WHERE features = 0 "
+                         "ORDER BY file_id;").fetchall()
+
+    # The file ids are never reused, the rows of the deleted files simply never match again
+    matrix[[file_id for file_id in removed_ids if file_id < len(matrix)]] = 0
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        vectors = executor.map(_image_features, [os.path.join(folder, fn) for _, fn in batch])
+        for (file_id, _), vector in zip(batch, vectors):
+            matrix[file_id] = vector or 0
+        # Written before the rows are marked, a crash only means computing them again
+        matrix.flush()
+        db.executemany("UPDATE image_files SET features = 1 WHERE file_id = ?;",
+                       [(file_id,) for file_id, _ in batch])
+        db.commit()
+        click.echo(f"    ✔ Computed the features of {start + len(batch)} of {len(pending)} image(s).")
+
+
+# Feature matrices mapped for the similarity search, by library: (size of the file, matrix)
+_feature_matrices = {}
+_feature_matrices_lock = threading.Lock()
+
+
+def _feature_matrix(library):
+    """Maps the feature matrix of a library for reading, again whenever the indexing grew it."""
+
+    path = _feature_matrix_path(library)
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return None
+
+    with _feature_matrices_lock:
+        cached = _feature_matrices.get(library)
+        if cached is None or cached[0] != size:
+            cached = (size, _open_feature_matrix(path))
+            _feature_matrices[library] = cached
+
+    return cached[1]
+
+
+def _most_similar(matrix, row, count, chunk_rows=16384):
+    """
+    Returns the (scores, rows) of the `count` rows of `matrix` closest to `row` by cosine
+    similarity, the closest first. The vectors have a unit length, so it is their dot product.
+    """
+
+    import numpy  # pylint: disable=import-outside-toplevel
+
+    query = numpy.asarray(matrix[row], dtype=numpy.float32)
+    found_scores, found_rows = [], []
+    # float16 has no fast matrix product, convert a chunk at a time to keep the memory use flat
+    for start in range(0, len(matrix), chunk_rows):
+        scores = numpy.asarray(matrix[start:start + chunk_rows], dtype=numpy.float32) @ query
+        if start <= row < start + len(scores):
+            scores[row - start] = -1.0
+        best = (numpy.argpartition(scores, -count)[-count:] if len(scores) > count
+                else numpy.arange(len(scores)))
+        found_scores.append(scores[best])
+        found_rows.append(best + start)
+
+    scores = numpy.concatenate(found_scores)
+    rows = numpy.concatenate(found_rows)
+    best = numpy.argsort(-scores, kind="stable")[:count]
+
+    return scores[best], rows[best]
+
+
+@click.command('index-images')
+@_library_option()
+@click.option('--batch-size', default=256, show_default=True,
+              help="Number of images indexed between two commits.")
+def index_images_command(batch_size):
+    """Index new and changed image files and forget the ones that were deleted."""
+
+    folder = _images_folder()
+    db = _get_db()
+
+    indexed = {fn: (file_id, mtime_ns, size) for file_id, fn, mtime_ns, size
+               in db.execute("SELECT file_id, fn, mtime_ns, size FROM image_files;")}
+    pending = []
+    for fn in _list_image_files(folder):
+        stat = os.stat(os.path.join(folder, fn))
+        if indexed.pop(fn, (None,))[1:] != (stat.st_mtime_ns, stat.st_size):
+            pending.append((fn, stat.st_mtime_ns, stat.st_size))
+
+    db.executemany("DELETE FROM image_files WHERE fn = ?;", [(fn,) for fn in indexed])
+    db.commit()
+    click.echo(f"Removed {len(indexed)} deleted image(s) from the index.")
+
+    from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel
+
+    workers = current_app.config.get("IMAGE_POOL_WORKERS", os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            metadata = executor.map(_index_image_file,
+                                    [os.path.join(folder, fn) for fn, *_ in batch])
+            db.executemany(
+                "INSERT INTO image_files (fn, mtime_ns, size, format, placeholder, width, height, "
+                "orientation, taken, camera, color) "
+                "VALUES (:fn, :mtime_ns, :size, :format, :placeholder, :width, :height, "
+                ":orientation, :taken, :camera, :color) "
+                "ON CONFLICT (fn) DO UPDATE SET mtime_ns = excluded.mtime_ns, "
+                "size = excluded.size, format = excluded.format, "
+                "placeholder = excluded.placeholder, "
+                "width = excluded.width, height = excluded.height, "
+                "orientation = excluded.orientation, taken = excluded.taken, "
+                "camera = excluded.camera, color = excluded.color, features = 0;",
+                [{
+                    "fn": fn, "mtime_ns": mtime_ns, "size": size,
+                    # Recognized among all the known formats, enabling one needs no new indexing
+                    "format": _sniff_format(os.path.join(folder, fn), INPUT_FORMATS) or "",
+                    **(m or dict.fromkeys(("placeholder", "width", "height", "orientation",
+                                           "taken", "camera", "color"))),
+                } for (fn, mtime_ns, size), m in zip(batch, metadata)]
+            )
+            db.commit()
+            click.echo(f"    ✔ Indexed {start + len(batch)} of {len(pending)} image(s).")
+
+        _index_features(db, folder, executor, batch_size,
+                        [file_id for file_id, *_ in indexed.values()])
+
+    click.echo("✔ Indexing complete.")
+
+
+app.cli.add_command(index_images_command)
+
+
+# Static files worth compressing, the others (images, icons) are already compressed
+COMPRESSIBLE_ASSETS = ('.css', '.js', '.svg', '.ttf', '.ico', '.json')
+ASSET_URL_PATTERN = re.compile(r"""url\((['"]?)([^'")]+)\1\)""")
+
+
+def _assets_folder():
+    return current_app.config.get("ASSETS_FOLDER",
+                                  os.path.join(current_app.root_path, "build", "assets"))
+
+
+def _fingerprint(rel_path: str, data: bytes) -> str:
+    base, ext = os.path.splitext(rel_path)
+
+    return f"{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+@click.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the static files, to be served with immutable caching."""
+
+    static_folder = current_app.static_folder
+    out_folder = _assets_folder()
+    manifest = {}
+
+    sources = sorted(
+        os.path.relpath(os.path.join(root, fn), static_folder).replace(os.sep, "/")
+        for root, _, files in os.walk(static_folder) for fn in files
+    )
+    # Stylesheets reference the other files, so they must be fingerprinted last
+    for rel_path in sorted(sources, key=lambda p: p.endswith('.css')):
+        with open(os.path.join(static_folder, rel_path), "rb") as f:
+            data = f.read()
+
+        if rel_path.endswith('.css'):
+            base = os.path.dirname(rel_path)
+
+            def rewrite(match, base=base):
+                target = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, "/")
+                if target not in manifest:
+                    return match.group(0)
+                hashed = os.path.relpath(manifest[target], base or ".").replace(os.sep, "/")
+                return f'url("{hashed}")'
+
+            data = ASSET_URL_PATTERN.sub(rewrite, data.decode("utf-8")).encode("utf-8")
+
+        hashed_path = _fingerprint(rel_path, data)
+        manifest[rel_path] = hashed_path
+        out_path = os.path.join(out_folder, hashed_path)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, "wb") as f:
+            f.write(data)
+
+        variants = []
+        if rel_path.endswith(COMPRESSIBLE_ASSETS):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                with open(f"{out_path}.gz", "wb") as f:
+                    f.write(compressed)
+                variants.append(f"gzip {len(compressed)}")
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    with open(f"{out_path}.br", "wb") as f:
+                        f.write(compressed)
+                    variants.append(f"br {len(compressed)}")
+
+        click.echo(f"    ✔ {rel_path} -> {hashed_path} ({len(data)} bytes"
+                   f"{''.join(f', {v}' for v in variants)})")
+
+    with open(os.path.join(out_folder, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+    # The copies of the previous builds are not referenced any more
+    kept = {"manifest.json"} | {f"{hashed}{suffix}" for hashed in manifest.values()
+                                for suffix in ("", ".gz", ".br")}
+    removed = 0
+    for folder_path, folders, files in os.walk(out_folder, topdown=False):
+        for fn in files:
+            path = os.path.join(folder_path, fn)
+            if os.path.relpath(path, out_folder).replace(os.sep, "/") not in kept:
+                os.remove(path)
+                removed += 1
+        for folder in folders:
+            with contextlib.suppress(OSError):
+                # Only succeeds for the folders left empty
+                os.rmdir(os.path.join(folder_path, folder))
+
+    if brotli is None:
+        click.echo("The brotli package is not installed, only gzip variants were created.")
+    click.echo(f"✔ Built {len(manifest)} asset(s) into \"{out_folder}\", "
+               f"removed {removed} outdated file(s).")
+
+    # Loading the templates fills the bytecode cache, new processes then skip compiling them
+    os.makedirs(_template_cache_folder, exist_ok=True)
+    templates = current_app.jinja_env.list_templates()
+    for name in templates:
+        current_app.jinja_env.get_template(name)
+    click.echo(f"✔ Compiled {len(templates)} template(s) into \"{_template_cache_folder}\".")
+
+
+app.cli.add_command(build_assets_command)
+
+
+# Runs in a new interpreter, timing the first steps of a freshly started application process
+STARTUP_REPORT_SCRIPT = """
+import json, sys, time
+
+timings = {{}}
+started = time.perf_counter()
+import {module} as web
+timings["import"] = time.perf_counter() - started
+
+loaded = {{}}
+client = web.app.test_client()
+for step, url in (("first JSON request", "/tags"), ("first page", "/")):
+    started = time.perf_counter()
+    client.get(url)
+    timings[step] = time.perf_counter() - started
+    loaded[step] = [name for name in ("PIL.Image", "concurrent.futures.process", "numpy")
+                    if name in sys.modules]
+
+images = client.get("/images").get_json() or []
+if images:
+    started = time.perf_counter()
+    client.get("/loadImage", query_string={{"fn": images[0], "tn": "true"}})
+    timings["first thumbnail"] = time.perf_counter() - started
+
+print(json.dumps({{"timings": timings, "loaded": loaded}}))
+"""
+
+
+@click.command('startup-report')
+@click.option('--budget', type=float, default=None,
+              help="Fail when importing the application and serving the first JSON request "
+                   "takes longer (in milliseconds).")
+@click.option('--top', default=10, show_default=True, help="Number of slowest imports listed.")
+def startup_report_command(budget, top):
+    """Print the import and initialization timings of a newly started application process."""
+
+    import subprocess  # pylint: disable=import-outside-toplevel
+
+    module = __name__
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_REPORT_SCRIPT.format(module=module)],
+        cwd=current_app.root_path, capture_output=True, text=True, check=False
+    )
+    if result.returncode != 0:
+        click.echo(result.stderr, err=True)
+        raise click.ClickException("The application could not be started.")
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    click.echo("Cold start of a new application process:")
+    for step, seconds in report["timings"].items():
+        click.echo(f"    {step:<20} {seconds * 1000:8.1f} ms")
+    for step, modules in report["loaded"].items():
+        click.echo(f"    Loaded after the {step}: {', '.join(modules) or 'no image modules'}")
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"^import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)$", line)
+        if match is not None and len(match.group(2)) <= 2:
+            imports.append((int(match.group(1)), match.group(3)))
+    click.echo("Slowest imports (including their own imports):")
+    for microseconds, name in sorted(imports, reverse=True)[:top]:
+        click.echo(f"    {name:<40} {microseconds / 1000:8.1f} ms")
+
+    total = (report["timings"]["import"] + report["timings"]["first JSON request"]) * 1000
+    if budget is not None:
+        if total > budget:
+            raise click.ClickException(f"The cold start took {total:.1f} ms, "
+                                       f"over the budget of {budget:.1f} ms.")
+        click.echo(f"✔ The cold start took {total:.1f} ms, within the budget of {budget:.1f} ms.")
+
+
+app.cli.add_command(startup_report_command)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_assets_manifest(path, mtime_ns): # pylint: disable=unused-argument
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _assets_manifest():
+    path = os.path.join(_assets_folder(), "manifest.json")
+    try:
+        return _load_assets_manifest(path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return {}
+
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file, fingerprinted when the assets were built (and not debugging)."""
+
+    manifest = {} if current_app.debug else _assets_manifest()
+    if filename not in manifest:
+        return url_for('static', filename=filename)
+
+    return url_for('assets', filename=manifest[filename])
+
+
+@app.route('/assets/<path:filename>', methods=('GET',))
+def assets(filename):
+    """Serves fingerprinted static files, precompressed when the client supports it."""
+
+    out_folder = _assets_folder()
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+
+    for encoding, suffix in encodings:
+        if (encoding in request.accept_encodings
+                and os.path.isfile(os.path.join(out_folder, filename + suffix))):
+            response = send_from_directory(out_folder, filename + suffix,
+                                           mimetype=mimetype, max_age=31_536_000)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(out_folder, filename, mimetype=mimetype, max_age=31_536_000)
+
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+
+    return response
+
+
+def _error_image(status, message):
+    from PIL import Image, ImageDraw, ImageFont  # pylint: disable=import-outside-toplevel
+
+    img_w, img_h = 1920, 1080
+    img = Image.new('RGB', (img_w, img_h), color='rgb(198, 198, 198)')
+    font = ImageFont.truetype(os.path.join("resources", "RobotoMono-Regular.ttf"), size=72.0)
+    text = '\n'.join([f"HTTP ERROR {status}"] + textwrap.wrap(message, 80))
+    draw = ImageDraw.Draw(img)
+    _, _, w, h = draw.textbbox((0, 0), text, font=font, align='center')
+    draw.text(((img_w - w) / 2, (img_h - h) / 2), text,
+              font=font, align='center', fill='rgb(255, 0, 255)')
+    img_io = BytesIO()
+    img.save(img_io, format='JPEG', quality=85)
+    img_io.seek(0)
+
+    return img_io
+
+
+@app.errorhandler(400)
+@app.errorhandler(404)
+@app.errorhandler(413)
+@app.errorhandler(415)
+@app.errorhandler(500)
+@app.errorhandler(501)
+@app.errorhandler(503)
+def server_error(err):
+    """Handle errors gracefully."""
+
+    lang = request.accept_languages.best_match(SUPPORTED_LANGS.keys())
+    if lang is None:
+        lang = DEFAULT_LANG
+
+    headers = { "Content-Language": lang }
+    retry_after = getattr(err, "retry_after", None)
+    if retry_after is not None:
+        headers["Retry-After"] = str(retry_after)
+
+    # Drawing the error image is image work as well, don't do it when the pool is saturated
+    if request.endpoint == 'load_image' and err.code != 503:
+        img_io = _error_image(err.code, err.description)
+        response = send_file(
+            img_io,
+            mimetype='image/jpeg',
+            as_attachment=False,
+            max_age=300
+        )
+
+        return response, err.code, headers
+
+    return jsonify({
+        "error": {
+            "code": err.code,
+            "name": err.name,
+        },
+        "reason": err.description,
+    }), err.code, headers
+
+
+@app.route('/', methods=('GET',))
+@with_localization
+def root(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """The main page of the application."""
+
+    ollama_translate_prompt = current_app.config.get("OLLAMA_TRANSLATE_TAGS_PROMPT", None)
+    ollama_model = current_app.config.get("OLLAMA_MODEL", None)
+    ollama_host = current_app.config.get("OLLAMA_HOST")
+    ollama_port = current_app.config.get("OLLAMA_PORT")
+    api_not_configured = (ollama_translate_prompt is None
+                          or ollama_model is None
+                          or ollama_host is None
+                          or ollama_port is None)
+
+    context = {
+        "VERSION": VERSION,
+        "lang": lang,
+        "library": g.library,
+        "langs": resources.get("langs"),
+        "ui": json.dumps(resources.get("ui")),
+        "api_not_configured": "true" if api_not_configured else "false",
+        "prefetch_depth": max(0, int(current_app.config.get("PREFETCH_DEPTH", 2))),
+    }
+
+    context.update(resources.get("template"))
+
+    c = None
+    try:
+        c = _get_db().cursor()
+        # The page follows the changes made after it was rendered
+        context["change_seq"] = _last_change(c)
+
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+    return render_template("index.html", **context), 200, { "Content-Language": lang }
+
+
+@app.route('/tagManagement', methods=('GET',))
+@with_localization
+def tag_management(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """The page that allows managing tags."""
+
+    ollama_translate_prompt = current_app.config.get("OLLAMA_TRANSLATE_TAGS_PROMPT", None)
+    ollama_model = current_app.config.get("OLLAMA_MODEL", None)
+    ollama_host = current_app.config.get("OLLAMA_HOST")
+    ollama_port = current_app.config.get("OLLAMA_PORT")
+    api_not_configured = (ollama_translate_prompt is None
+                          or ollama_model is None
+                          or ollama_host is None
+                          or ollama_port is None)
+    context = {
+        "VERSION": VERSION,
+        "lang": lang,
+        "library": g.library,
+        "ui": json.dumps({**resources.get("ui"), "langs": resources.get("langs") }),
+        "api_not_configured": "true" if api_not_configured else "false",
+        "prefetch_depth": max(0, int(current_app.config.get("PREFETCH_DEPTH", 2))),
+    }
+
+    context.update(resources.get("template"))
+
+    c = None
+    try:
+        c = _get_db().cursor()
+        # The page follows the changes made after it was rendered
+        context["change_seq"] = _last_change(c)
+
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+    return render_template("manage.html", **context), 200, { "Content-Language": lang }
+
+
+def _image_query():
+    """
+    Returns the SQL conditions, their parameters, the sort expression and direction of the
+    `sort`, `orientation` and range filter arguments of the request (None when they are all
+    missing), or raises ValueError when one of them is not valid.
+    """
+
+    conditions = []
+    params = []
+    for arg, (condition, convert) in IMAGE_FILTERS.items():
+        value = request.args.get(arg, None)
+        if value is not None:
+            params.append(convert(value))
+            conditions.append(condition)
+
+    orientation = request.args.get("orientation", None)
+    if orientation is not None:
+        if orientation not in IMAGE_ORIENTATIONS:
+            raise ValueError(f"Unknown orientation: {orientation}")
+        conditions.append(IMAGE_ORIENTATIONS[orientation])
+
+    sort = request.args.get("sort", None)
+    if sort is not None and sort.removeprefix("-") not in IMAGE_SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    if sort is None and not conditions:
+        return None
+
+    sort = sort or "name"
+
+    return conditions, params, IMAGE_SORT_KEYS[sort.removeprefix("-")], sort.startswith("-")
+
+
+def _order_by(sort_key, descending):
+    return f"{sort_key} {'DESC' if descending else 'ASC'} NULLS LAST, f.fn"
+
+
+@app.route('/images', methods=('GET',))
+@with_localization
+def images(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """Lists all the images."""
+
+    folder = _images_folder()
+    with_placeholders = request.args.get("placeholders", "false") == "true"
+
+    try:
+        query = _image_query()
+
+    except ValueError:
+        return abort(400, resources.get("validation").get("not _image_query()"))
+
+    c = None
+    try:
+        listing = _list_images(folder)
+
+        if query is not None:
+            conditions, params, sort_key, descending = query
+
+            db = _get_db()
+            c = db.cursor()
+
+            c.execute(f"SELECT f.fn, f.placeholder FROM image_files AS f "
+                      f"WHERE {' AND '.join(conditions) or 'TRUE'} "
+                      f"ORDER BY {_order_by(sort_key, descending)};",
+                      params)
+            # The index may still list files deleted since it was last updated
+            listed = set(listing)
+            found = [(fn, p) for fn, p in c if fn in listed]
+            if not conditions:
+                # Sorting alone leaves no image out: the files not indexed yet come last
+                indexed = {fn for fn, _ in found}
+                found.extend((fn, None) for fn in listing if fn not in indexed)
+
+            return ([{ "fn": fn, "placeholder": p } for fn, p in found] if with_placeholders
+                    else [fn for fn, _ in found]), 200, { "Content-Language": lang }
+
+        if not with_placeholders:
+            return listing, 200, { "Content-Language": lang }
+
+        db = _get_db()
+        c = db.cursor()
+
+        c.execute("SELECT fn, placeholder FROM image_files;")
+        placeholders = dict(c.fetchall())
+
+        return [
+            { "fn": fn, "placeholder": placeholders.get(fn) } for fn in listing
+        ], 200, { "Content-Language": lang }
+
+    except FileNotFoundError:
+        current_app.logger.exception('Failed to list images: Configured folder not found.')
+        return abort(500,
+                     resources.get("except").get("FileNotFoundError"))
+    except PermissionError:
+        current_app.logger.exception('Failed to list images: Permission denied.')
+        return abort(500,
+                     resources.get("except").get("PermissionError"))
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+
+def _search_shards(c, libraries, tags_list, with_placeholders, query):
+    """
+    Searches several libraries at once by attaching their databases to the current connection.
+    Tag ids are only meaningful within a library, so the tags are matched by name.
+    """
+
+    conditions, query_params, sort_key, descending = query or ([], [], "NULL", False)
+
+    c.execute(f"SELECT name FROM tags WHERE tag_id IN ({','.join('?' * len(tags_list))});",
+              tags_list)
+    names = [name for name, *_ in c]
+    if not names:
+        return []
+
+    current = _current_library()
+    others = [library for library in libraries if library != current and _prepare_shard(library)]
+    found = []
+    # SQLite only allows a few attached databases (10 by default), search them in chunks
+    for start in range(0, max(len(others), 1), 8):
+        schemas = [(library, f"shard{i}") for i, library in enumerate(others[start:start + 8])]
+        for library, schema in schemas:
+            c.execute(f"ATTACH DATABASE ? AS {schema};", (_libraries()[library]["DATABASE"],))
+        if start == 0 and current in libraries:
+            schemas.insert(0, (current, "main"))
+
+        try:
+            queries = []
+            params = []
+            for library, schema in schemas:
+                queries.append(
+                    f"SELECT ? AS library, i.fn, {'f.placeholder' if with_placeholders else 'NULL'}, "
+                    f"{sort_key} "
+                    f"FROM {schema}.images AS i "
+                    # The images not indexed yet have no sort value and match no filter
+                    + (f"LEFT JOIN {schema}.image_files AS f ON f.fn = i.fn "
+                       if with_placeholders or query else "") +
+                    f"WHERE i.image_id IN ("
+                    f"SELECT ti.image_id FROM {schema}.tagged_images AS ti "
+                    f"JOIN {schema}.tags AS t ON t.tag_id = ti.tag_id "
+                    f"WHERE t.name IN ({','.join('?' * len(names))}) "
+                    f"GROUP BY ti.image_id HAVING COUNT(DISTINCT t.name) = ?)"
+                    + "".join(f" AND {condition}" for condition in conditions)
+                )
+                params.extend((library, *names, len(names), *query_params))
+
+            c.execute(" UNION ALL ".join(queries) + ";", params)
+            found.extend(c.fetchall())
+
+        finally:
+            for library, schema in schemas:
+                if schema != "main":
+                    c.execute(f"DETACH DATABASE {schema};")
+
+    found.sort(key=lambda image: (image[0], image[1]))
+    if query is not None:
+        # Sorting is stable, the images with the same value stay sorted by library and name
+        found = (sorted((image for image in found if image[3] is not None),
+                        key=lambda image: image[3], reverse=descending)
+                 + [image for image in found if image[3] is None])
+
+    return [
+        { "library": library, "fn": fn, "placeholder": p } if with_placeholders
+        else { "library": library, "fn": fn }
+        for library, fn, p, _ in found
+    ]
+
+
+@app.route('/searchImages', methods=('POST',))
+@with_localization
+def search_images(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """Search images by tags"""
+
+    tags_data = request.form.get('tags')
+    if tags_data is None:
+        return abort(400, resources.get("validation").get("tags_data is None"))
+
+    try:
+        tags_list = json.loads(tags_data)
+
+    except json.JSONDecodeError:
+        return abort(400, resources.get("except").get("json.JSONDecodeError"))
+
+    is_what_we_expect = {
+        'tags': isinstance(tags_list, list) and tags_list
+    }
+    if not is_what_we_expect['tags']:
+        return abort(400, resources.get("validation").get("not is_what_we_expect['tags']"))
+
+    with_placeholders = request.args.get("placeholders", "false") == "true"
+    libraries = request.args.get("libraries", None)
+
+    try:
+        query = _image_query()
+
+    except ValueError:
+        return abort(400, resources.get("validation").get("not _image_query()"))
+
+    if libraries is not None:
+        libraries = list(_libraries()) if libraries == "*" else libraries.split(",")
+        if any(library not in _libraries() for library in libraries):
+            return abort(404, resources.get("validation").get("library not in _libraries()"))
+
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
+
+        if libraries is not None:
+            return _search_shards(c, libraries, tags_list, with_placeholders, query), 200, {
+                "Content-Language": lang
+            }
+
+        def search():
+            c.execute(
+                f"""
+                SELECT tag_id, image_id FROM tagged_images
+                WHERE tag_id IN ({','.join('?' * len(tags_list))});
+                """,
+                tags_list
+            )
+
+            d = defaultdict(set)
+            for tag_id, image_id in c:
+                d[tag_id].add(image_id)
+            found_images = list(set.intersection(*d.values()))
+
+            if query is not None:
+                conditions, params, sort_key, descending = query
+                c.execute(
+                    f"""
+                    SELECT i.fn, f.placeholder FROM images AS i
+                    LEFT JOIN image_files AS f ON f.fn = i.fn
+                    WHERE i.image_id IN ({','.join('?' * len(found_images))})
+                    {"".join(f" AND {condition}" for condition in conditions)}
+                    ORDER BY {_order_by(sort_key, descending)}, i.fn;
+                    """,
+                    (*found_images, *params)
+                )
+
+                return ([{ "fn": fn, "placeholder": p } for fn, p in c] if with_placeholders
+                        else [fn for fn, _ in c])
+
+            c.execute(
+                f"""
+                SELECT i.fn, f.placeholder FROM images AS i
+                LEFT JOIN image_files AS f ON f.fn = i.fn
+                WHERE i.image_id IN ({','.join('?' * len(found_images))});
+                """
+                if with_placeholders else
+                f"""
+                SELECT fn FROM images
+                WHERE image_id IN ({','.join('?' * len(found_images))});
+                """,
+                found_images
+            )
+
+            return ([{ "fn": fn, "placeholder": p } for fn, p in c] if with_placeholders
+                    else [fn for fn, *_ in c])
+
+        # Keyed by the tags and the parameters of the request
+        found_images = _get_query_cache().get(
+            g.db_library, ("taggedImages", "imageFiles"),
+            ("searchImages", json.dumps(tags_list), request.query_string), search
+        )
+
+        return found_images, 200, { "Content-Language": lang }
+
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+
+# Images matching a saved search: all of its required tags and none of the excluded ones
+SAVED_SEARCH_MATCHES = """
+    SELECT ti.image_id FROM tagged_images AS ti
+    JOIN saved_search_tags AS st ON st.tag_id = ti.tag_id AND st.search_id = :search_id
+    GROUP BY ti.image_id
+    HAVING SUM(st.excluded = 0) = (SELECT required FROM saved_searches WHERE search_id = :search_id)
+    AND SUM(st.excluded) = 0
+"""
+
+
+def _refresh_saved_search(c, search_id):
+    """
+    Brings the results of a saved search in line with its definition. Only the differences are
+    written, so the version only changes when the results do.
+    """
+
+    c.execute(f"DELETE FROM saved_search_images WHERE search_id = :search_id "
+              f"AND image_id NOT IN ({SAVED_SEARCH_MATCHES});",
+              { "search_id": search_id })
+    c.execute(f"INSERT OR IGNORE INTO saved_search_images (search_id, image_id) "
+              f"SELECT :search_id, image_id FROM ({SAVED_SEARCH_MATCHES});",
+              { "search_id": search_id })
+
+
+def _retarget_saved_searches(c, tag_ids, keep_id=None):
+    """
+    Replaces merged tags by the tag they were merged into (or drops deleted tags) in the saved
+    searches using them. The results of the other searches are kept up to date by triggers.
+    """
+
+    placeholders = ', '.join('?' * len(tag_ids))
+    c.execute(f"SELECT DISTINCT search_id FROM saved_search_tags WHERE tag_id IN ({placeholders});",
+              tag_ids)
+    affected = [search_id for search_id, in c]
+    if not affected:
+        return
+
+    if keep_id is not None:
+        # A search already using the kept tag keeps its own condition for it
+        c.execute(f"UPDATE OR IGNORE saved_search_tags SET tag_id = ? "
+                  f"WHERE tag_id IN ({placeholders});",
+                  (keep_id, *tag_ids))
+    c.execute(f"DELETE FROM saved_search_tags WHERE tag_id IN ({placeholders});",
+              tag_ids)
+
+    # The definition of the searches changed, their version too even when the results did not
+    for search_id in affected:
+        c.execute("UPDATE saved_searches SET required = ("
+                  "SELECT COUNT(*) FROM saved_search_tags WHERE search_id = ? AND excluded = 0"
+                  "), version = version + 1 WHERE search_id = ?;",
+                  (search_id, search_id))
+        _refresh_saved_search(c, search_id)
+
+
+def _saved_searches(c, search_id=None):
+    c.execute("SELECT search_id, name, size, version FROM saved_searches "
+              + ("WHERE search_id = ? " if search_id is not None else "") + "ORDER BY name;",
+              () if search_id is None else (search_id,))
+    searches = {
+        row_id: { "id": row_id, "name": name, "tags": [], "excluded": [],
+                  "size": size, "version": version }
+        for row_id, name, size, version in c
+    }
+
+    c.execute("SELECT search_id, tag_id, excluded FROM saved_search_tags "
+              + ("WHERE search_id = ? " if search_id is not None else "") + "ORDER BY tag_id;",
+              () if search_id is None else (search_id,))
+    for row_id, tag_id, excluded in c:
+        searches[row_id]["excluded" if excluded else "tags"].append(tag_id)
+
+    return list(searches.values())
+
+
+@app.route('/savedSearches', methods=('GET',))
+@with_localization
+def saved_searches(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """Lists the saved searches, with their tags and number of images."""
+
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
+
+        return _saved_searches(c), 200, { "Content-Language": lang }
+
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+
+@app.route('/addSavedSearch', methods=('POST',))
+@with_localization
+def add_saved_search(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """Saves a search for the images with all the "tags" and none of the "excluded" tags."""
+
+    name = request.form.get('name', None)
+    tags_data = request.form.get('tags', None)
+    excluded_data = request.form.get('excluded', '[]')
+
+    if not name or not name.strip():
+        return abort(400, resources.get("validation").get("not name or not name.strip()"))
+    if tags_data is None:
+        return abort(400, resources.get("validation").get("tags_data is None"))
+
+    try:
+        tags_list = json.loads(tags_data)
+        excluded_list = json.loads(excluded_data)
+
+    except json.JSONDecodeError:
+        return abort(400, resources.get("except").get("json.JSONDecodeError"))
+
+    is_what_we_expect = {
+        'tags': (isinstance(tags_list, list) and tags_list
+                 and all(isinstance(t, int) for t in tags_list)),
+        'excluded': (isinstance(excluded_list, list)
+                     and all(isinstance(t, int) for t in excluded_list)),
+    }
+    if not is_what_we_expect['tags']:
+        return abort(400, resources.get("validation").get("not is_what_we_expect['tags']"))
+    if not is_what_we_expect['excluded']:
+        return abort(400, resources.get("validation").get("not is_what_we_expect['excluded']"))
+    if set(tags_list) & set(excluded_list):
+        return abort(400, resources.get("validation").get("set(tags_list) & set(excluded_list)"))
+
+    tags_list = sorted(set(tags_list))
+    excluded_list = sorted(set(excluded_list))
+
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
+
+        db.execute("BEGIN")
+
+        c.execute("INSERT INTO saved_searches (name, required) VALUES (?, ?);",
+                  (name.strip(), len(tags_list)))
+        search_id = c.lastrowid
+        c.executemany("INSERT INTO saved_search_tags (search_id, tag_id, excluded) VALUES (?, ?, ?);",
+                      [(search_id, t, 0) for t in tags_list]
+                      + [(search_id, t, 1) for t in excluded_list])
+        _refresh_saved_search(c, search_id)
+
+        search, = _saved_searches(c, search_id)
+
+        db.commit()
+
+        return search, 201, { "Content-Language": lang }
+
+    except sqlite3.IntegrityError:
+        db.rollback()
+        current_app.logger.exception('Database Integrity Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.IntegrityError"))
+    except sqlite3.OperationalError:
+        db.rollback()
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+
+@app.route('/deleteSavedSearch', methods=('POST',))
+@with_localization
+def delete_saved_search(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """Deletes the saved search given by the "id" form field."""
+
+    search_id = request.form.get('id', None)
+
+    if search_id is None:
+        return abort(400, resources.get("validation").get("search_id is None"))
+    if not search_id.isdigit():
+        return abort(400, resources.get("validation").get("not search_id.isdigit()"))
+
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
+
+        db.execute("BEGIN")
+
+        # The tags and results of the search are deleted by a trigger
+        c.execute("DELETE FROM saved_searches WHERE search_id = ?;",
+                  (int(search_id),))
+
+        db.commit()
+
+        return {
+            "status": "success",
+            "removed": int(search_id)
+        }, 200, { "Content-Language": lang }
+
+    except sqlite3.OperationalError:
+        db.rollback()
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
 
 
-@app.route('/', methods=('GET',))
+@app.route('/savedSearch', methods=('GET',))
 @with_localization
-def root(lang: str, resources: Mapping[str, Mapping[str, Any]]):
-    """The main page of the application."""
+def saved_search(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """
+    Returns the images found by a saved search, from its stored results. The version of the
+    search is part of the ETag of the response, so clients can revalidate without downloading them.
+    """
 
-    ollama_translate_prompt = current_app.config.get("OLLAMA_TRANSLATE_TAGS_PROMPT", None)
-    ollama_model = current_app.config.get("OLLAMA_MODEL", None)
-    ollama_host = current_app.config.get("OLLAMA_HOST")
-    ollama_port = current_app.config.get("OLLAMA_PORT")
-    api_not_configured = (ollama_translate_prompt is None
-                          or ollama_model is None
-                          or ollama_host is None
-                          or ollama_port is None)
+    search_id = request.args.get('id', None)
+    with_placeholders = request.args.get("placeholders", "false") == "true"
 
-    context = {
-        "VERSION": VERSION,
-        "lang": lang,
-        "langs": resources.get("langs"),
-        "ui": json.dumps(resources.get("ui")),
-        "api_not_configured": "true" if api_not_configured else "false",
-    }
+    if search_id is None:
+        return abort(400, resources.get("validation").get("search_id is None"))
+    if not search_id.isdigit():
+        return abort(400, resources.get("validation").get("not search_id.isdigit()"))
 
-    context.update(resources.get("template"))
+    try:
+        query = _image_query()
 
-    return render_template("index.html", **context), 200, { "Content-Language": lang }
+    except ValueError:
+        return abort(400, resources.get("validation").get("not _image_query()"))
 
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
 
-@app.route('/tagManagement', methods=('GET',))
-@with_localization
-def tag_management(lang: str, resources: Mapping[str, Mapping[str, Any]]):
-    """The page that allows managing tags."""
+        # The images are sorted, filtered and given their placeholders from image_files, which
+        # index-images updates without changing the version of the search. Read first, so that
+        # the response is never older than the ETag.
+        variant = [sorted(request.args.items(multi=True))]
+        if query is not None or with_placeholders:
+            variant.append(_cache_generations(g.db_library).get("imageFiles", 0))
 
-    ollama_translate_prompt = current_app.config.get("OLLAMA_TRANSLATE_TAGS_PROMPT", None)
-    ollama_model = current_app.config.get("OLLAMA_MODEL", None)
-    ollama_host = current_app.config.get("OLLAMA_HOST")
-    ollama_port = current_app.config.get("OLLAMA_PORT")
-    api_not_configured = (ollama_translate_prompt is None
-                          or ollama_model is None
-                          or ollama_host is None
-                          or ollama_port is None)
-    context = {
-        "VERSION": VERSION,
-        "lang": lang,
-        "ui": json.dumps({**resources.get("ui"), "langs": resources.get("langs") }),
-        "api_not_configured": "true" if api_not_configured else "false",
-    }
+        c.execute("SELECT version FROM saved_searches WHERE search_id = ?;",
+                  (int(search_id),))
+        r = c.fetchone()
 
-    context.update(resources.get("template"))
+        if r is None:
+            return abort(404, resources.get("validation").get("r is None"))
 
-    return render_template("manage.html", **context), 200, { "Content-Language": lang }
+        etag = (f"{search_id}.{r[0]}."
+                f"{hashlib.sha1(repr(variant).encode('utf-8')).hexdigest()[:12]}")
+        headers = {
+            "Content-Language": lang,
+            "ETag": f'"{etag}"',
+            "Cache-Control": "no-cache",
+        }
+        if request.if_none_match.contains(etag):
+            return "", 304, headers
 
+        search, = _saved_searches(c, int(search_id))
+        conditions, params, sort_key, descending = query or ([], [], None, False)
 
-@app.route('/images', methods=('GET',))
-@with_localization
-def images(lang: str, resources: Mapping[str, Mapping[str, Any]]):
-    """Lists all the images."""
+        c.execute(f"SELECT i.fn, f.placeholder FROM saved_search_images AS m "
+                  f"JOIN images AS i ON i.image_id = m.image_id "
+                  f"{'JOIN' if query else 'LEFT JOIN'} image_files AS f ON f.fn = i.fn "
+                  f"WHERE m.search_id = ?{''.join(f' AND {condition}' for condition in conditions)} "
+                  f"ORDER BY {_order_by(sort_key, descending) if query else 'i.fn'};",
+                  (int(search_id), *params))
 
-    folder = current_app.config["IMAGES_FOLDER"]
+        search["images"] = ([{ "fn": fn, "placeholder": p } for fn, p in c] if with_placeholders
+                            else [fn for fn, _ in c])
 
-    try:
-        return [
-            fn for fn in sorted(os.listdir(folder))
-            if os.path.isfile(os.path.join(folder, fn))
-            and os.path.splitext(fn)[-1] in ('.bmp', '.jpg', '.png')
-        ], 200, { "Content-Language": lang }
+        return search, 200, headers
 
-    except FileNotFoundError:
-        current_app.logger.exception('Failed to list images: Configured folder not found.')
-        return abort(500,
-                     resources.get("except").get("FileNotFoundError"))
-    except PermissionError:
-        current_app.logger.exception('Failed to list images: Permission denied.')
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
         return abort(500,
-                     resources.get("except").get("PermissionError"))
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
 
 
-@app.route('/searchImages', methods=('POST',))
+@app.route('/similarImages', methods=('GET',))
 @with_localization
-def search_images(lang: str, resources: Mapping[str, Mapping[str, Any]]):
-    """Search images by tags"""
-
-    tags_data = request.form.get('tags')
-    if tags_data is None:
-        return abort(400, resources.get("validation").get("tags_data is None"))
-
-    try:
-        tags_list = json.loads(tags_data)
+def similar_images(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """Lists the images that look the most like an image, the most similar first."""
 
-    except json.JSONDecodeError:
-        return abort(400, resources.get("except").get("json.JSONDecodeError"))
+    folder = _images_folder()
+    fn = request.args.get('fn', None)
+    limit = request.args.get('limit', '24')
 
-    is_what_we_expect = {
-        'tags': isinstance(tags_list, list) and tags_list
-    }
-    if not is_what_we_expect['tags']:
-        return abort(400, resources.get("validation").get("not is_what_we_expect['tags']"))
+    if not fn:
+        return abort(400, resources.get("validation").get("not fn"))
+    if not limit.isdigit() or int(limit) == 0:
+        return abort(400, resources.get("validation").get("not limit.isdigit()"))
+    limit = min(int(limit), current_app.config.get("SIMILAR_IMAGES_MAX_LIMIT", 200))
 
     c = None
     try:
         db = _get_db()
         c = db.cursor()
 
-        c.execute(
-            f"""
-            SELECT tag_id, image_id FROM tagged_images
-            WHERE tag_id IN ({','.join('?' * len(tags_list))});
-            """,
-            tags_list
-        )
+        c.execute("SELECT file_id FROM image_files WHERE fn = ? AND features = 1;",
+                  (fn,))
+        r = c.fetchone()
+        matrix = _feature_matrix(g.library)
 
-        d = defaultdict(set)
-        for tag_id, image_id in c:
-            d[tag_id].add(image_id)
-        found_images = list(set.intersection(*d.values()))
-        c.execute(
-            f"""
-            SELECT fn FROM images
-            WHERE image_id IN ({','.join('?' * len(found_images))});
-            """,
-            found_images
-        )
+        if r is None or matrix is None or r[0] >= len(matrix):
+            return abort(404, resources.get("validation").get("r is None"))
 
-        found_images = [fn for fn, *_ in c]
+        # A few more, the index may still list files deleted since it was last updated
+        scores, rows = _most_similar(matrix, r[0], 2 * limit)
+        found = [(int(row), float(score)) for score, row in zip(scores, rows) if score > 0]
 
-        return found_images, 200, { "Content-Language": lang }
+        c.execute(f"SELECT file_id, fn FROM image_files "
+                  f"WHERE features = 1 AND file_id IN ({', '.join('?' * len(found))});",
+                  [row for row, _ in found])
+        names = dict(c.fetchall())
+        listed = _listed_images(folder)
 
+        return [
+            { "fn": names[row], "score": round(score, 4) } for row, score in found
+            if names.get(row) in listed
+        ][:limit], 200, { "Content-Language": lang }
+
+    except ImportError:
+        current_app.logger.exception('The similarity search requires numpy.')
+        return abort(501,
+                     resources.get("except").get("ImportError"))
+    except FileNotFoundError:
+        current_app.logger.exception('Failed to list images: Configured folder not found.')
+        return abort(500,
+                     resources.get("except").get("FileNotFoundError"))
     except sqlite3.OperationalError:
         current_app.logger.exception('Database Operational Error.')
         return abort(500,
@@ -344,11 +2854,16 @@ def search_images(lang: str, resources: Mapping[str, Mapping[str, Any]]):
 @with_localization
 def load_image(lang: str, # pylint: disable=unused-argument
                resources: Mapping[str, Mapping[str, Any]]):
-    """Loads and optionally resizes an image, serving it as JPEG."""
+    """Loads and optionally resizes an image, serving it in the best format the client accepts."""
+
+    from concurrent.futures.process import BrokenProcessPool  # pylint: disable=import-outside-toplevel
+    from PIL import Image, UnidentifiedImageError  # pylint: disable=import-outside-toplevel
 
-    folder = current_app.config["IMAGES_FOLDER"]
+    folder = _images_folder()
     fn = request.args.get('fn', None)
     make_thumbnail = request.args.get('tn', 'false').lower() == 'true'
+    # The images the pager shows next, prefetched
+    neighbours = request.args.getlist('prefetch')
 
     if not fn:
         return abort(400, resources.get("validation").get("not fn"))
@@ -358,36 +2873,61 @@ def load_image(lang: str, # pylint: disable=unused-argument
         return abort(404, resources.get("validation").get("not os.path.isfile(path)"))
 
     try:
-        with Image.open(path) as img:
-            # Convert to RGB (JPEG doesn’t support RGBA or P)
-            img = img.convert("RGB")
-
-            # If tn=true, make a thumbnail
-            if make_thumbnail:
-                img.thumbnail((192, 108), Image.Resampling.LANCZOS)
-
-            # Write image to memory buffer as JPEG
-            img_io = BytesIO()
-            img.save(img_io, format='JPEG', quality=85, optimize=True)
-            img_io.seek(0)
-
-            # Serve directly from memory
-            response = send_file(
-                img_io,
-                mimetype='image/jpeg',
-                as_attachment=False,
-                max_age=2_592_000  # 30 days
-            )
-
-            return response
-
+        if _sniff_format(path) is None:
+            current_app.logger.warning("Image %s is not in an enabled format.", fn)
+            return abort(415,
+                         resources.get("except").get("UnidentifiedImageError"))
+
+        output_format = _negotiate_output_format()
+        key = _rendition_key(path, make_thumbnail, output_format)
+        cache = _get_rendition_cache()
+        img_bytes = cache.get(key)
+        if img_bytes is None:
+            max_pixels = current_app.config.get("IMAGE_MAX_PIXELS", 7680 * 4320)
+            pool = _get_image_pool()
+            box, cost = _decode_plan(path, make_thumbnail, max_pixels, pool.budget.max_bytes)
+            img_bytes = pool.submit(
+                key, _render_image, path, make_thumbnail, output_format, max_pixels, box,
+                cost=cost
+            ).result()
+            cache.put(key, img_bytes)
+
+        if neighbours:
+            _prefetch_neighbours(folder, neighbours, make_thumbnail, output_format)
+
+        # Serve directly from memory, or from the memory map of the shared cache
+        response = send_file(
+            BytesIO(img_bytes) if isinstance(img_bytes, bytes) else img_bytes,
+            mimetype=OUTPUT_FORMATS[output_format][0],
+            as_attachment=False,
+            max_age=2_592_000  # 30 days
+        )
+        # Only known from BytesIO objects, not from memory maps
+        response.content_length = len(img_bytes)
+        response.vary.add("Accept")
+
+        return response
+
+    except ImagePoolSaturated:
+        current_app.logger.warning("Image pool saturated, rejecting request for %s.", fn)
+        return abort(503,
+                     resources.get("except").get("ImagePoolSaturated"),
+                     retry_after=current_app.config.get("IMAGE_POOL_RETRY_AFTER", 1))
+    except (ImageTooLarge, Image.DecompressionBombError):
+        current_app.logger.warning("Image %s is too large to be decoded.", fn)
+        return abort(413,
+                     resources.get("except").get("ImageTooLarge"))
+    except BrokenProcessPool:
+        current_app.logger.exception("Image pool worker terminated abruptly.")
+        return abort(500,
+                     resources.get("except").get("OSError"))
     except PermissionError:
         current_app.logger.exception("Could not load image file.")
         return abort(500,
                      resources.get("except").get("PermissionError"))
     except UnidentifiedImageError:
-        current_app.logger.exception("Unidentified image format.")
-        return abort(500,
+        current_app.logger.warning("Image %s can not be decoded.", fn)
+        return abort(415,
                      resources.get("except").get("UnidentifiedImageError"))
     except OSError:
         current_app.logger.exception("File access error.")
@@ -408,24 +2948,27 @@ def tags(lang: str, resources: Mapping[str, Mapping[str, Any]]):
         db = _get_db()
         c = db.cursor()
 
-        c.execute(f"SELECT t.tag_id, COALESCE(tt.name, t.name) AS name, t.used, "
-                  f"t.lang, COALESCE(tt.description, t.description) AS description, "
-                  f"t.name AS original_name, t.description as original_description "
-                  f"FROM tags AS t LEFT JOIN tags_{lang} as tt ON t.tag_id = tt.tag_id;"
-                  if extended else
-                  f"SELECT t.tag_id, COALESCE(tt.name, t.name) AS name, t.used "
-                  f"FROM tags AS t LEFT JOIN tags_{lang} as tt ON t.tag_id = tt.tag_id;")
-
-        t = ([{
-                   "id": i,
-                   "name": n,
-                   "used": u,
-                   "lang": l,
-                   "description": d,
-                   "originalName": on,
-                   "originalDescription": od,
-              } for i, n, u, l, d, on, od in c] if extended
-             else [{ "id": i, "name": n, "used": u } for i, n, u in c])
+        def list_tags():
+            names = _tag_names_in(c, lang)
+
+            c.execute("SELECT tag_id, used, lang, name, description FROM tags;"
+                      if extended else
+                      "SELECT tag_id, used FROM tags;")
+
+            return ([{
+                         "id": i,
+                         "name": names[i][0],
+                         "used": u,
+                         "lang": l,
+                         "description": names[i][1],
+                         "originalName": on,
+                         "originalDescription": od,
+                    } for i, u, l, on, od in c if i in names] if extended
+                    else [{ "id": i, "name": names[i][0], "used": u } for i, u in c if i in names])
+
+        # The list has the usage counts, tagging an image changes it
+        t = _get_query_cache().get(g.db_library, ("tags", "tagUsage"), ("tags", lang, extended),
+                                   list_tags)
 
         return t, 200, { "Content-Language": lang }
 
@@ -477,11 +3020,85 @@ def image_tags(lang: str, resources: Mapping[str, Mapping[str, Any]]):
             c.close()
 
 
+def _suggest_tags(c, tag_ids, limit):
+    """
+    Scores the tags seen together with `tag_ids` by the sum of their pointwise mutual information
+    (the log of the lift) with each of them, discounted for pairs seen only a few times.
+    """
+
+    c.execute("SELECT value FROM counters WHERE name = 'taggedImages';")
+    r = c.fetchone()
+    tagged = r[0] if r is not None else 0
+
+    # Rarely seen pairs score low anyway, the most frequent neighbors of every tag are enough
+    neighbors = current_app.config.get("TAG_SUGGESTION_NEIGHBORS", 250)
+    pairs = []
+    for tag_id in tag_ids:
+        c.execute("SELECT p.other_id, p.count, t.used, o.used FROM tag_pairs AS p "
+                  "JOIN tags AS t ON t.tag_id = p.tag_id JOIN tags AS o ON o.tag_id = p.other_id "
+                  "WHERE p.tag_id = ? ORDER BY p.count DESC LIMIT ?;",
+                  (tag_id, neighbors))
+        pairs.extend(c.fetchall())
+
+    scores = defaultdict(float)
+    for other_id, count, used, other_used in pairs:
+        # The counters are read one after the other, a tag may have lost its images meanwhile
+        if other_id in tag_ids or min(count, used, other_used, tagged) <= 0:
+            continue
+        pmi = math.log(count * tagged / (used * other_used))
+        if pmi <= 0:
+            continue
+        # Pantel and Lin's discount, rare tags would otherwise win on a single shared image
+        rarest = min(used, other_used)
+        scores[other_id] += pmi * count / (count + 1) * rarest / (rarest + 1)
+
+    best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    return [{ "id": tag_id, "score": round(score, 4) } for tag_id, score in best]
+
+
+@app.route('/suggestTags', methods=('GET',))
+@with_localization
+def suggest_tags(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """Returns the tags most likely to be added to an image with the given tags, best first."""
+
+    tags_data = request.args.get('tags', '')
+    limit = request.args.get('limit', '10')
+
+    tags_list = [t.strip() for t in tags_data.split(',') if t.strip()]
+    if not all(t.isdigit() for t in tags_list):
+        return abort(400, resources.get("validation").get("not all(t.isdigit() for t in tags_list)"))
+    if not limit.isdigit():
+        return abort(400, resources.get("validation").get("not limit.isdigit()"))
+
+    if not tags_list:
+        return [], 200, { "Content-Language": lang }
+
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
+
+        suggestions = _suggest_tags(c, [int(t) for t in tags_list], int(limit))
+
+        return suggestions, 200, { "Content-Language": lang }
+
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+
 @app.route('/translateTags', methods=('POST',))
 @with_localization
 def translate_tags(lang: str, resources: Mapping[str, Mapping[str, Any]]):
     """Translate tags with an LLM using the ollama API"""
 
+    from http.client import HTTPConnection  # pylint: disable=import-outside-toplevel
+
     ollama_translate_prompt = current_app.config.get("OLLAMA_TRANSLATE_TAGS_PROMPT", None)
     ollama_model = current_app.config.get("OLLAMA_MODEL", None)
     ollama_host = current_app.config.get("OLLAMA_HOST")
@@ -591,10 +3208,16 @@ def translate_tags(lang: str, resources: Mapping[str, Mapping[str, Any]]):
         for t in translated_data:
             assert "id" in t and "name" in t and "description" in t, \
                 f"The model returned a malformed dictionary: {json.dumps(t)}"
-            c.execute(f"INSERT INTO tags_{dest_lang} VALUES (:id, :name, :description) "
-                      f"ON CONFLICT (tag_id) DO "
-                      f"UPDATE SET name = :name, description = :description "
-                      f"WHERE tag_id = :id;", t)
+            c.execute("INSERT INTO tag_translations (tag_id, lang, name, description) "
+                      "VALUES (:id, :lang, :name, :description) "
+                      "ON CONFLICT (tag_id, lang) DO "
+                      "UPDATE SET name = :name, description = :description;",
+                      { **t, "lang": dest_lang })
+            for field in ("name", "description"):
+                _log_change(c, "tagUpdated",
+                            { "tagId": t["id"], "field": field, "newValue": t[field],
+                              "lang": dest_lang },
+                            key=f"tag:{t['id']}:{field}:{dest_lang}")
 
         db.commit()
 
@@ -660,6 +3283,16 @@ def add_tag(lang: str, resources: Mapping[str, Mapping[str, Any]]):
 
         tag_id = c.lastrowid
 
+        _log_change(c, "tagCreated", {
+            "id": tag_id,
+            "lang": content_lang,
+            "name": name,
+            "description": description,
+            "originalName": name,
+            "originalDescription": description,
+            "used": 0,
+        })
+
         db.commit()
 
         return {
@@ -736,17 +3369,17 @@ def toggle_tags(lang: str, resources: Mapping[str, Mapping[str, Any]]):
             if t in current_tags:
                 c.execute("DELETE FROM tagged_images WHERE image_id = ? AND tag_id = ?;",
                           (i, t))
-                c.execute("UPDATE tags SET used = used - 1 WHERE tag_id = ?;",
-                          (t,))
             else:
                 c.execute("INSERT INTO tagged_images (image_id, tag_id) VALUES (?, ?);",
                           (i, t))
-                c.execute("UPDATE tags SET used = used + 1 WHERE tag_id = ?;",
-                          (t,))
+
+        new_tags = list(current_tags ^ set(tags_to_toggle))
+        _log_change(c, "imageTagsUpdated", { "fn": fn, "tags": new_tags }, key=f"image:{fn}")
+        _log_used_changes(c, tags_to_toggle)
 
         db.commit()
 
-        return list(current_tags ^ set(tags_to_toggle)), 200, { "Content-Language": lang }
+        return new_tags, 200, { "Content-Language": lang }
 
     except sqlite3.IntegrityError:
         db.rollback()
@@ -769,20 +3402,26 @@ def tag_info(lang: str, resources: Mapping[str, Mapping[str, Any]]):
     """Returns information on the specified tag"""
 
     tag_id = request.args.get('tag', None)
+    with_placeholders = request.args.get("placeholders", "false") == "true"
 
     if tag_id is None:
         return abort(400, resources.get("validation").get("tag_id is None"))
+    if not tag_id.isdigit():
+        return abort(400, resources.get("validation").get("not tag_id.isdigit()"))
 
     c = None
     try:
         db = _get_db()
         c = db.cursor()
 
-        c.execute(f"SELECT COALESCE(tt.description, t.description) AS description, t.used "
-                  f"FROM tags AS t LEFT JOIN tags_{lang} as tt ON t.tag_id = tt.tag_id "
-                  f"WHERE t.tag_id = ?;",
+        tag = _tag_names_in(c, lang).get(int(tag_id))
+        if tag is None:
+            return abort(404, resources.get("validation").get("tag is None"))
+        _, desc = tag
+
+        c.execute("SELECT used FROM tags WHERE tag_id = ?;",
                   (tag_id,))
-        desc, used = c.fetchone()
+        used, *_ = c.fetchone()
 
         resp = {
             "description": desc,
@@ -797,11 +3436,16 @@ def tag_info(lang: str, resources: Mapping[str, Mapping[str, Any]]):
         image_ids = image_ids if len(image_ids) < 4 else random.sample(image_ids, 3)
 
         c.execute(
+            f"SELECT i.fn, f.placeholder FROM images AS i "
+            f"LEFT JOIN image_files AS f ON f.fn = i.fn "
+            f"WHERE i.image_id IN ({', '.join('?' * len(image_ids))});"
+            if with_placeholders else
             f"SELECT fn FROM images WHERE image_id IN ({', '.join('?' * len(image_ids))});",
             image_ids
         )
 
-        resp["images"] = [fn for fn, *_ in c]
+        resp["images"] = ([{ "fn": fn, "placeholder": p } for fn, p in c] if with_placeholders
+                          else [fn for fn, *_ in c])
 
         return resp, 200, { "Content-Language": lang }
 
@@ -825,6 +3469,8 @@ def update_tag(lang: str, resources: Mapping[str, Mapping[str, Any]]):
 
     if tag_id is None:
         return abort(400, resources.get("validation").get("tag_id is None"))
+    if not tag_id.isdigit():
+        return abort(400, resources.get("validation").get("not tag_id.isdigit()"))
 
     c = None
     try:
@@ -832,30 +3478,37 @@ def update_tag(lang: str, resources: Mapping[str, Mapping[str, Any]]):
         c = db.cursor()
 
         # Only update provided fields
-        fields = []
-        params = []
-        if name is not None:
-            fields.append("name = ?")
-            params.append(name)
-        if description is not None:
-            fields.append("description = ?")
-            params.append(description)
+        fields = [(field, value) for field, value in (("name", name), ("description", description))
+                  if value is not None]
 
         if not fields:
             return { "status": "no changes" }, 200, { "Content-Language": lang }
 
         db.execute("BEGIN")
 
-        params.append(tag_id)
-        c.execute(f"UPDATE OR IGNORE tags_{lang} SET {', '.join(fields)} WHERE tag_id = ?;",
-                  params)
-        params.append(lang)
-        c.execute(f"UPDATE tags SET {', '.join(fields)} WHERE tag_id = ? AND lang = ?;",
-                  params)
+        changed = False
+        for field, value in fields:
+            # Only the rows whose value really changes, the others are not logged as changes
+            params = (value, tag_id, lang, value)
+            c.execute(f"UPDATE OR IGNORE tag_translations SET {field} = ? "
+                      f"WHERE tag_id = ? AND lang = ? AND {field} IS NOT ?;",
+                      params)
+            updated = c.rowcount
+            c.execute(f"UPDATE tags SET {field} = ? "
+                      f"WHERE tag_id = ? AND lang = ? AND {field} IS NOT ?;",
+                      params)
+            updated += c.rowcount
+
+            if updated > 0:
+                changed = True
+                _log_change(c, "tagUpdated",
+                            { "tagId": int(tag_id), "field": field, "newValue": value,
+                              "lang": lang },
+                            key=f"tag:{tag_id}:{field}:{lang}")
 
         db.commit()
 
-        return { "status": "success" }, 200, { "Content-Language": lang }
+        return { "status": "success" if changed else "no changes" }, 200, { "Content-Language": lang }
 
     except sqlite3.IntegrityError:
         db.rollback()
@@ -925,19 +3578,18 @@ def de_duplicate(lang: str, resources: Mapping[str, Mapping[str, Any]]):
             (keep_id, *remove_ids)
         )
 
-        # Step 3: Delete the redundant tag rows
+        # Step 3: Delete the redundant tag rows (used is kept up to date by triggers)
         c.execute(
             f"DELETE FROM tags WHERE tag_id IN ({', '.join('?' * len(remove_ids))});",
             remove_ids
         )
 
-        # Step 4: Update used
-        c.execute(
-            "UPDATE OR IGNORE tags SET used = ("
-                "SELECT COUNT(*) FROM tagged_images WHERE tag_id = ?"
-            ") WHERE tag_id = ?;",
-            (keep_id, keep_id)
-        )
+        # Step 4: Search for the kept tag instead in the saved searches
+        _retarget_saved_searches(c, remove_ids, keep_id)
+
+        _log_change(c, "tagsMerged",
+                    { "status": "success", "kept": keep_id, "removed": remove_ids })
+        _log_used_changes(c, [keep_id])
 
         db.commit()
 
@@ -999,16 +3651,16 @@ def delete_tags(lang: str, resources: Mapping[str, Mapping[str, Any]]):
             tags_list
         )
 
-        # Step 2: Delete the actual tags
+        # Step 2: Delete the actual tags (and their translations, by trigger)
         c.execute(
             f"DELETE FROM tags WHERE tag_id IN ({', '.join('?' * len(tags_list))});",
             tags_list
         )
-        for l in SUPPORTED_LANGS:
-            c.execute(
-                f"DELETE FROM tags_{l} WHERE tag_id IN ({', '.join('?' * len(tags_list))});",
-                tags_list
-            )
+
+        # Step 3: Remove them from the saved searches
+        _retarget_saved_searches(c, tags_list)
+
+        _log_change(c, "tagsRemoved", { "status": "success", "removed": tags_list })
 
         db.commit()
 
@@ -1054,3 +3706,253 @@ def latest(lang: str, resources: Mapping[str, Mapping[str, Any]]):
     finally:
         if c is not None:
             c.close()
+
+
+@app.route('/untaggedImages', methods=('GET',))
+@with_localization
+def untagged_images(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """
+    Returns the next images (in folder order, after the `after` file name) with fewer than
+    `minTags` tags, and the progress of the tagging.
+    """
+
+    folder = _images_folder()
+    after = request.args.get('after', '')
+    limit = request.args.get('limit', '10')
+    min_tags = request.args.get('minTags', '1')
+
+    if not limit.isdigit():
+        return abort(400, resources.get("validation").get("not limit.isdigit()"))
+    if not min_tags.isdigit() or not 0 < int(min_tags) <= 100:
+        return abort(400, resources.get("validation").get("not min_tags.isdigit()"))
+    limit = min(int(limit), 500)
+    min_tags = int(min_tags)
+
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
+
+        # An equality on tag_count for every count keeps each lookup a range of the index
+        tag_counts = list(range(min_tags))
+        found = []
+        # Polling the progress (limit=0) lists nothing
+        if limit > 0:
+            # The index may still list files deleted since it was last updated, skip them until
+            # the page is full: an empty page means there are no untagged images left
+            listed = _listed_images(folder)
+            while len(found) < limit:
+                c.execute(f"SELECT fn FROM image_files "
+                          f"WHERE tag_count IN ({', '.join('?' * len(tag_counts))}) AND fn > ? "
+                          f"ORDER BY fn LIMIT ?;",
+                          (*tag_counts, after, limit))
+                scanned = [fn for fn, in c]
+                found.extend(fn for fn in scanned if fn in listed)
+                if len(scanned) < limit:
+                    break
+                after = scanned[-1]
+            found = found[:limit]
+
+        # Only the files of the enabled formats are listed, and those not recognized yet
+        formats = (*_input_formats(), "?")
+        c.execute(f"SELECT COALESCE(SUM(files), 0), "
+                  f"COALESCE(SUM(files) FILTER (WHERE tag_count < ?), 0) FROM file_tag_counts "
+                  f"WHERE format IN ({', '.join('?' * len(formats))});",
+                  (min_tags, *formats))
+        files, remaining = c.fetchone()
+
+        # Nor the files deleted since the index was last updated
+        missing = _missing_image_files(folder)
+        if missing:
+            c.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE tag_count < ?) FROM image_files "
+                      f"WHERE fn IN (SELECT value FROM json_each(?)) "
+                      f"AND COALESCE(format, '?') IN ({', '.join('?' * len(formats))});",
+                      (min_tags, json.dumps(missing), *formats))
+            missing_files, missing_remaining = c.fetchone()
+            files -= missing_files
+            remaining -= missing_remaining
+
+        return {
+            "images": found,
+            "progress": {
+                "files": files,
+                "done": files - remaining,
+                "remaining": remaining,
+            },
+        }, 200, { "Content-Language": lang }
+
+    except FileNotFoundError:
+        current_app.logger.exception('Failed to list images: Configured folder not found.')
+        return abort(500,
+                     resources.get("except").get("FileNotFoundError"))
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+
+@app.route('/metrics', methods=('GET',))
+@with_localization
+def metrics(lang: str, resources: Mapping[str, Mapping[str, Any]]): # pylint: disable=unused-argument
+    """Returns runtime statistics of the image processing subsystems, for the answering process"""
+
+    return {
+        "process": { "pid": os.getpid(), "processes": _server_processes() },
+        "imagePool": _get_image_pool().stats(),
+        "renditionCache": _get_rendition_cache().stats(),
+        "queryCache": _get_query_cache().stats(),
+        "libraries": _shards_stats(),
+    }, 200, { "Content-Language": lang }
+
+
+@app.route('/changes', methods=('GET',))
+@with_localization
+def changes(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """Returns the changes made after the `since` sequence number, in order"""
+
+    since = request.args.get("since", None)
+    limit = current_app.config.get("CHANGE_FEED_PAGE_SIZE", 500)
+
+    if since is None:
+        return abort(400, resources.get("validation").get("since is None"))
+    if not since.isdigit():
+        return abort(400, resources.get("validation").get("not since.isdigit()"))
+
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
+
+        logged = _read_changes(c, int(since), limit)
+
+        if logged is None:
+            return {
+                "reset": True,
+                "seq": _last_change(c),
+                "changes": [],
+                "more": False,
+            }, 200, { "Content-Language": lang }
+
+        return {
+            "reset": False,
+            "seq": logged[-1][0] if logged else int(since),
+            "changes": [{ "seq": seq, "type": kind, "details": json.loads(details) }
+                        for seq, kind, details in logged],
+            "more": len(logged) == limit,
+        }, 200, { "Content-Language": lang }
+
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+
+# Change streams open in this process, each one holds a server thread while it is open
+_change_streams = 0
+_change_streams_lock = threading.Lock()
+
+
+def _close_change_stream():
+    global _change_streams # pylint: disable=global-statement
+
+    with _change_streams_lock:
+        _change_streams -= 1
+
+
+@app.route('/changes/stream', methods=('GET',))
+@with_localization
+def change_feed(lang: str, resources: Mapping[str, Mapping[str, Any]]):
+    """
+    Streams the changes as server-sent events, starting after the `Last-Event-ID` header or the
+    `since` sequence number (or with the next change when none is given). At most
+    `CHANGE_FEED_MAX_STREAMS` streams are open at once in a process, the others are refused so that
+    they can not take all the threads serving the other requests.
+    """
+
+    global _change_streams # pylint: disable=global-statement
+
+    since = request.headers.get("Last-Event-ID", request.args.get("since", None))
+    poll_interval = current_app.config.get("CHANGE_FEED_POLL_INTERVAL", 1.0)
+    timeout = current_app.config.get("CHANGE_FEED_TIMEOUT", 300)
+    limit = current_app.config.get("CHANGE_FEED_PAGE_SIZE", 500)
+    database = _libraries()[g.library]["DATABASE"]
+
+    if since is not None and not since.isdigit():
+        return abort(400, resources.get("validation").get("not since.isdigit()"))
+
+    c = None
+    try:
+        db = _get_db()
+        c = db.cursor()
+
+        since = _last_change(c) if since is None else int(since)
+
+    except sqlite3.OperationalError:
+        current_app.logger.exception('Database Operational Error.')
+        return abort(500,
+                     resources.get("except").get("sqlite3.OperationalError"))
+    finally:
+        if c is not None:
+            c.close()
+
+    def stream(since):
+        # The stream outlives the request, so it can not use the connection of the request
+        db = sqlite3.connect(database, check_same_thread=False)
+        try:
+            yield f"retry: {int(poll_interval * 1000)}\n\n"
+            started = last_sent = time.monotonic()
+            data_version = None
+            while time.monotonic() - started < timeout:
+                # data_version only changes when another connection commits
+                version, *_ = db.execute("PRAGMA data_version;").fetchone()
+                if version == data_version:
+                    # Comments keep the proxies from closing an idle connection
+                    if time.monotonic() - last_sent > 15:
+                        yield ": keep-alive\n\n"
+                        last_sent = time.monotonic()
+                    time.sleep(poll_interval)
+                    continue
+
+                c = db.cursor()
+                try:
+                    logged = _read_changes(c, since, limit)
+                finally:
+                    c.close()
+                    db.rollback()
+
+                if logged is None:
+                    yield "event: reset\ndata: {}\n\n"
+                    return
+
+                for seq, kind, details in logged:
+                    yield f"id: {seq}\nevent: {kind}\ndata: {details}\n\n"
+                    since = seq
+                last_sent = time.monotonic()
+
+                if len(logged) < limit:
+                    data_version = version
+        finally:
+            db.close()
+
+    with _change_streams_lock:
+        if _change_streams >= current_app.config.get("CHANGE_FEED_MAX_STREAMS", 8):
+            return abort(503,
+                         resources.get("except").get("TooManyStreams"),
+                         retry_after=current_app.config.get("CHANGE_FEED_RETRY_AFTER", 30))
+        _change_streams += 1
+
+    response = current_app.response_class(stream(since), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "Content-Language": lang,
+    })
+    # Called by the server once the stream is over, whether it was started or not
+    response.call_on_close(_close_change_stream)
+
+    return response